@@ -1,25 +1,35 @@
 import os
+import io
+import csv
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
 import sqlalchemy
 from sqlalchemy import create_engine, text
 import logging
 from datetime import datetime
-import hashlib
 import re
 import glob
+import fnmatch
+import itertools
 import json
 from collections import defaultdict
 import argparse
 import multiprocessing
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing.util import Finalize
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import time
-from tqdm import tqdm
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+from email.message import EmailMessage
 import yaml
 
+try:
+    from pgcopy import CopyManager
+except ImportError:  # Only needed for --copy-format binary
+    CopyManager = None
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -33,7 +43,31 @@ DB_CONFIG = {
 
 def create_engine_url():
     """Create SQLAlchemy engine URL"""
-    return f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}/{DB_CONFIG['database']}"
+    return (f"postgresql+psycopg2://{DB_CONFIG['user']}:{DB_CONFIG['password']}@"
+            f"{DB_CONFIG['host']}:{DB_CONFIG.get('port', 5432)}/{DB_CONFIG['database']}")
+
+def create_db_engine(pool_size=5):
+    """
+    Create the SQLAlchemy engine used for uploads.
+    
+    psycopg2's fast execution helpers are enabled so that any executemany INSERT
+    (the non-COPY fallback path) is sent as a few multi-row statements instead of
+    one round trip per row. Sessions skip waiting for the WAL flush on commit, which
+    is safe for bulk loads that can simply be rerun after a server crash.
+    
+    Args:
+        pool_size (int): Number of connections kept open in the pool
+    """
+    return create_engine(
+        create_engine_url(),
+        executemany_mode='values_plus_batch',
+        insertmanyvalues_page_size=10000,
+        executemany_batch_page_size=500,
+        pool_size=pool_size,
+        max_overflow=4,
+        pool_pre_ping=True,
+        connect_args={'options': '-c synchronous_commit=off -c work_mem=256MB'}
+    )
 
 def clean_column_name(column_name):
     """Clean column names to be SQL-friendly"""
@@ -48,106 +82,213 @@ def get_table_name(file_path, file_type=None):
         base_name = os.path.basename(file_path).split('-')[0]  # Get the first part of the filename
         return f"{base_name}_{file_type}_data"
 
+# Validation patterns are compiled once at import time and shared by all schemas
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z0-9\-_]+$')
+BASES_PATTERN = re.compile(r'^[ACGT]+$')
+
+# Chromosomes are stored as SMALLINT codes: autosomes by number, then X, Y and mitochondrial
+CHROM_CODES = {str(i): i for i in range(1, 26)}
+CHROM_CODES.update({'X': 23, 'Y': 24, 'M': 25, 'MT': 25})
+
+# File type detection from the lowercased path. Each alternative is a lookahead from the
+# start of the path, so the first listed type that matches anywhere wins.
+_TYPE_RE = re.compile(
+    r'^(?:(?=.*(?P<tmb>tmb))'
+    r'|(?=.*(?P<cns>\.cns$))'
+    r'|(?=.*(?P<coverage>mean_gene_coverage))'
+    r'|(?=.*(?P<mastervar>mastervarfinal))'
+    r'|(?=.*(?P<segments>segments\.called\.named)))',
+    re.DOTALL
+)
+
+TABLE_SCHEMAS = {
+    'tmb': {
+        'SampleName': {'type': str, 'required': True, 'pattern': IDENTIFIER_PATTERN},
+        'TMB': {'type': float, 'required': True, 'min': 0},
+        'BinomialLow': {'type': float, 'required': True, 'min': 0, 'max': 1},
+        'BinomialHigh': {'type': float, 'required': True, 'min': 0, 'max': 1}
+    },
+    'cns': {
+        'CHROM': {'type': int, 'required': True, 'min': 1, 'max': 25},
+        'START': {'type': int, 'required': True, 'min': 0},
+        'STOP': {'type': int, 'required': True, 'min': 0},
+        'GENE': {'type': str, 'required': True, 'pattern': IDENTIFIER_PATTERN},
+        'log2': {'type': float, 'required': True},
+        'SampleName': {'type': str, 'required': True, 'pattern': IDENTIFIER_PATTERN}
+    },
+    'mean_gene_coverage': {
+        'SampleName': {'type': str, 'required': True, 'pattern': IDENTIFIER_PATTERN},
+        'GENE': {'type': str, 'required': True, 'pattern': IDENTIFIER_PATTERN},
+        'MEAN_COVERAGE': {'type': float, 'required': True, 'min': 0}
+    },
+    'mastervar': {
+        'SampleName': {'type': str, 'required': True, 'pattern': IDENTIFIER_PATTERN},
+        'CHROM': {'type': int, 'required': True, 'min': 1, 'max': 25},
+        'POS': {'type': int, 'required': True, 'min': 0},
+        'REF': {'type': str, 'required': True, 'pattern': BASES_PATTERN},
+        'ALT': {'type': str, 'required': True, 'pattern': BASES_PATTERN},
+        'AF': {'type': float, 'required': True, 'min': 0, 'max': 1}
+    }
+}
+
 def get_table_schema(table_type):
     """
-    Define expected data types and validation rules for each table.
-    """
-    schemas = {
-        'tmb': {
-            'SampleName': {'type': str, 'required': True, 'pattern': r'^[A-Za-z0-9\-_]+$'},
-            'TMB': {'type': float, 'required': True, 'min': 0},
-            'BinomialLow': {'type': float, 'required': True, 'min': 0, 'max': 1},
-            'BinomialHigh': {'type': float, 'required': True, 'min': 0, 'max': 1}
-        },
-        'cns': {
-            'CHROM': {'type': str, 'required': True, 'pattern': r'^(chr)?\d+$|^(chr)?[XY]$'},
-            'START': {'type': int, 'required': True, 'min': 0},
-            'STOP': {'type': int, 'required': True, 'min': 0},
-            'GENE': {'type': str, 'required': True, 'pattern': r'^[A-Za-z0-9\-_]+$'},
-            'log2': {'type': float, 'required': True},
-            'SampleName': {'type': str, 'required': True, 'pattern': r'^[A-Za-z0-9\-_]+$'}
-        },
-        'mean_gene_coverage': {
-            'SampleName': {'type': str, 'required': True, 'pattern': r'^[A-Za-z0-9\-_]+$'},
-            'GENE': {'type': str, 'required': True, 'pattern': r'^[A-Za-z0-9\-_]+$'},
-            'MEAN_COVERAGE': {'type': float, 'required': True, 'min': 0}
-        },
-        'mastervar': {
-            'SampleName': {'type': str, 'required': True, 'pattern': r'^[A-Za-z0-9\-_]+$'},
-            'CHROM': {'type': str, 'required': True, 'pattern': r'^(chr)?\d+$|^(chr)?[XY]$'},
-            'POS': {'type': int, 'required': True, 'min': 0},
-            'REF': {'type': str, 'required': True, 'pattern': r'^[ACGT]+$'},
-            'ALT': {'type': str, 'required': True, 'pattern': r'^[ACGT]+$'},
-            'AF': {'type': float, 'required': True, 'min': 0, 'max': 1}
-        }
-    }
-    return schemas.get(table_type, {})
+    Return expected data types and validation rules for each table.
+    """
+    return TABLE_SCHEMAS.get(table_type, {})
+
+def _clean_chrom(series):
+    # Encode chromosome names as small integer codes (e.g., 'chr1' to 1, 'X' to 23);
+    # unrecognised names become null
+    values = series.astype('string').str.upper().str.removeprefix('CHR')
+    return values.map(CHROM_CODES).astype('Int8')
+
+INT32_INFO = np.iinfo(np.int32)
+
+def _to_float(series):
+    # Single precision keeps ~7 significant digits, plenty for TMB, log2 ratios and
+    # allele fractions, at half the memory and REAL column width
+    return pd.to_numeric(series, errors='coerce').astype('float32')
+
+def _to_int(series):
+    # Handle cases where integers are stored as floats
+    values = np.trunc(pd.to_numeric(series, errors='coerce'))
+    # Genomic positions fit comfortably in 32 bits; only widen when a value does not.
+    # Bounds are taken over the present values, so an all-null chunk stays Int32
+    present = values.dropna()
+    if present.empty or (present.min() >= INT32_INFO.min and present.max() <= INT32_INFO.max):
+        return values.astype('Int32')
+    return values.astype('Int64')
+
+def _to_str(series):
+    return series.astype('string').str.strip()
+
+COLUMN_STANDARDIZERS = {
+    float: _to_float,
+    int: _to_int,
+    str: _to_str,
+}
 
-def standardize_value(value, column_name, schema):
+def standardize_column(series, column_name, schema):
     """
-    Standardize values based on column type and rules.
+    Standardize a column of values based on column type and rules.
+    Values that cannot be converted are set to null.
     """
-    if pd.isna(value):
-        return None
-        
-    try:
-        if 'CHROM' in column_name:
-            # Standardize chromosome format (e.g., 'chr1' to '1')
-            value = str(value).upper().replace('CHR', '')
-            if value == 'X':
-                value = '23'
-            elif value == 'Y':
-                value = '24'
-            return value
-            
-        elif schema['type'] == float:
-            return float(value)
-        elif schema['type'] == int:
-            return int(float(value))  # Handle cases where integers are stored as floats
-        elif schema['type'] == str:
-            return str(value).strip()
-            
-    except (ValueError, TypeError):
-        return None
+    if 'CHROM' in column_name:
+        return _clean_chrom(series)
+    standardizer = COLUMN_STANDARDIZERS.get(schema['type'])
+    return standardizer(series) if standardizer else series
+
+def pattern_matches(values, pattern):
+    """
+    Return a boolean numpy mask of which string values fully match a compiled pattern.
     
-    return value
+    Matching runs in Arrow's native regex engine over the whole column; nulls never match.
+    """
+    arr = pa.array(values, type=pa.string(), from_pandas=True)
+    if pattern is IDENTIFIER_PATTERN:
+        # Alphanumerics plus '-' and '_' only: map the two symbols onto a letter and use
+        # the character-class kernel instead of a regex
+        arr = pc.replace_substring(pc.replace_substring(arr, '-', 'a'), '_', 'a')
+        matches = pc.ascii_is_alnum(arr)
+    else:
+        matches = pc.match_substring_regex(arr, pattern.pattern)
+    return matches.fill_null(False).to_numpy(zero_copy_only=False)
+
+def generate_record_hashes(df):
+    """
+    Generate a unique 64-bit hash for each record to detect duplicates.
+    """
+    # Fix the column order once so the hash does not depend on how the file laid out its
+    # columns, then hash all rows in one vectorised pass
+    return pd.util.hash_pandas_object(df[sorted(df.columns)], index=False)
 
-def generate_record_hash(row):
+def encode_record_hashes(df):
     """
-    Generate a unique hash for a record to detect duplicates.
+    Replace the raw '_rh_u64' hash column with the BIGINT 'record_hash' stored in the database.
+    """
+    # Reinterpret the unsigned 64-bit fingerprint as a signed BIGINT without copying
+    record_hash = pd.array(df['_rh_u64'].to_numpy().view(np.int64), dtype='Int64')
+    return df.drop(columns='_rh_u64').assign(record_hash=record_hash)
+
+def read_tsv(file_path, chunksize=None, **kwargs):
+    """
+    Read a tab-separated file into Arrow-backed columns.
+    
+    Whole files use the multithreaded pyarrow parser. With chunksize, an iterator of
+    DataFrames is returned instead; the pyarrow engine cannot read in chunks, so the
+    C parser is used for that case.
+    """
+    if chunksize:
+        return pd.read_csv(file_path, sep='\t', chunksize=chunksize, dtype_backend='pyarrow', **kwargs)
+    return pd.read_csv(file_path, sep='\t', engine='pyarrow', dtype_backend='pyarrow', **kwargs)
+
+def read_tsv_columns(file_path, positions, names, chunksize=None):
+    """
+    Read selected columns of a headerless tab-separated file by position.
+    
+    Args:
+        file_path (str): Path to the file
+        positions (list): Zero-based column positions to read
+        names (list): Column names, one per entry in positions
+        chunksize (int): If set, return an iterator of DataFrames of this many rows
     """
-    # Convert row to string, sort keys to ensure consistent ordering
-    row_str = str(sorted(row.items()))
-    return hashlib.md5(row_str.encode()).hexdigest()
+    if chunksize:
+        # Headerless columns are labelled by their position, so select them in the requested order
+        def rename(chunk):
+            chunk = chunk[positions]
+            chunk.columns = names
+            return chunk
+        return (rename(chunk) for chunk in read_tsv(file_path, chunksize, header=None, usecols=positions))
+    
+    # pyarrow names headerless columns f0, f1, ... so positions map to names directly
+    table = pa_csv.read_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(autogenerate_column_names=True),
+        parse_options=pa_csv.ParseOptions(delimiter='\t'),
+        convert_options=pa_csv.ConvertOptions(include_columns=[f"f{pos}" for pos in positions])
+    )
+    return table.rename_columns(names).to_pandas(types_mapper=pd.ArrowDtype)
 
-def read_file(file_path):
-    """Read different file types into pandas DataFrame"""
+def read_file(file_path, chunksize=None):
+    """
+    Read different file types into pandas DataFrame.
+    
+    With chunksize, returns an iterator of DataFrames of up to chunksize rows instead,
+    so large files never have to be held in memory at once.
+    """
     ext = os.path.splitext(file_path)[1].lower()
     base_name = os.path.basename(file_path).lower()
+    # Get sample name from file name (everything before first period)
+    sample_name = os.path.basename(file_path).split('.')[0]
     
     try:
         if base_name == 'tmb2022.tsv':
             # Special handling for TMB file
-            df = pd.read_csv(file_path, sep='\t')
-            # Select and rename specific columns
-            df = df[['Samplename', 'FAF', 'FAD', 'FRD']].copy()
-            df.columns = ['SampleName', 'TMB', 'BinomialLow', 'BinomialHigh']
+            frames = read_tsv(file_path, chunksize)
+            def shape(df):
+                # Select and rename specific columns
+                df = df[['Samplename', 'FAF', 'FAD', 'FRD']].copy()
+                df.columns = ['SampleName', 'TMB', 'BinomialLow', 'BinomialHigh']
+                return df
         elif ext == '.cns':
             # Special handling for CNS files
-            df = pd.read_csv(file_path, sep='\t')
-            # Get sample name from file name (everything before first period)
-            sample_name = os.path.basename(file_path).split('.')[0]
-            # Select and rename columns
-            df = df[['chromosome', 'start', 'end', 'gene', 'log2', 'ci_hi', 'ci_lo', 'cn', 'depth', 'probes', 'weight']].copy()
-            df.columns = ['CHROM', 'START', 'STOP', 'GENE', 'log2', 'ci_hi', 'ci_lo', 'cn', 'DEPTH', 'probes', 'weight']
-            # Add SampleName column
-            df['SampleName'] = sample_name
+            frames = read_tsv(file_path, chunksize)
+            def shape(df):
+                # Select and rename columns
+                df = df[['chromosome', 'start', 'end', 'gene', 'log2', 'ci_hi', 'ci_lo', 'cn', 'depth', 'probes', 'weight']].copy()
+                df.columns = ['CHROM', 'START', 'STOP', 'GENE', 'log2', 'ci_hi', 'ci_lo', 'cn', 'DEPTH', 'probes', 'weight']
+                # Add SampleName column
+                df['SampleName'] = sample_name
+                return df
         elif 'mean_gene_coverage.tsv' in base_name:
             # Special handling for mean_gene_coverage.tsv files
-            df = pd.read_csv(file_path, sep='\t')
-            # Select and rename columns
-            df = df[['NAME', 'GENE', 'MEAN_COVERAGE']].copy()
-            df.columns = ['SampleName', 'GENE', 'MEAN_COVERAGE']
+            frames = read_tsv(file_path, chunksize)
+            def shape(df):
+                # Select and rename columns
+                df = df[['NAME', 'GENE', 'MEAN_COVERAGE']].copy()
+                df.columns = ['SampleName', 'GENE', 'MEAN_COVERAGE']
+                return df
         elif 'run_mastervarfinal.txt' in base_name:
             # Special handling for Run_masterVarFinal.txt files
             column_names = [
@@ -156,59 +297,59 @@ def read_file(file_path):
                 'GENE_REGION', 'DEPTH', 'RD', 'AD', 'AF', 'STRAND', 'START', 'STOP'
             ]
             usecols = [0, 1, 2, 66, 67, 3, 4, 11, 27, 15, 5, 16, 25, 26, 51, 52, 53, 54, 13, 58]
-            df = pd.read_csv(file_path, sep='\t', usecols=usecols, names=column_names)
+            frames = read_tsv_columns(file_path, usecols, column_names, chunksize)
+            def shape(df):
+                return df
         elif 'segments.called.named.tsv' in base_name:
             # Special handling for segments.called.named.tsv files
-            df = pd.read_csv(file_path, sep='\t')
-            # Get sample name from file name (everything before first period)
-            sample_name = os.path.basename(file_path).split('.')[0]
-            # Ensure all required columns exist and select them in the specified order
-            required_columns = [
-                'SampleName', 'GENE', 'CHROM', 'START', 'STOP', 'log2', 'cn', 'DEPTH',
-                'weight', 'ci_hi', 'ci_lo', 'probes', 'segment_weight', 'segment_probes'
-            ]
-            # Map existing column names to required names (assuming they might have different cases)
-            column_mapping = {col.lower(): col for col in required_columns}
-            df_columns = {col.lower(): col for col in df.columns}
-            
-            # Create new DataFrame with required columns
-            new_df = pd.DataFrame()
-            for req_col_lower, req_col in column_mapping.items():
-                if req_col_lower in df_columns:
-                    new_df[req_col] = df[df_columns[req_col_lower]]
-                else:
-                    # If column doesn't exist, fill with None
-                    new_df[req_col] = None
-            
-            # Ensure SampleName is set
-            new_df['SampleName'] = sample_name
-            df = new_df
-        elif ext in ['.tsv', '.txt']:
-            df = pd.read_csv(file_path, sep='\t')
-        elif ext == '.cnr':
-            # Assuming these are tab-separated as well, adjust if needed
-            df = pd.read_csv(file_path, sep='\t')
+            frames = read_tsv(file_path, chunksize)
+            def shape(df):
+                # Ensure all required columns exist and select them in the specified order
+                required_columns = [
+                    'SampleName', 'GENE', 'CHROM', 'START', 'STOP', 'log2', 'cn', 'DEPTH',
+                    'weight', 'ci_hi', 'ci_lo', 'probes', 'segment_weight', 'segment_probes'
+                ]
+                # Match existing column names to required names case-insensitively; missing
+                # columns are filled with nulls
+                df.columns = [col.lower() for col in df.columns]
+                df = df.loc[:, ~df.columns.duplicated(keep='last')]
+                df = df.rename(columns={col.lower(): col for col in required_columns})
+                new_df = df.reindex(columns=required_columns)
+                
+                # Ensure SampleName is set
+                new_df['SampleName'] = sample_name
+                return new_df
+        elif ext in ['.tsv', '.txt', '.cnr']:
+            # .cnr files are assumed to be tab-separated as well, adjust if needed
+            frames = read_tsv(file_path, chunksize)
+            def shape(df):
+                # Clean column names for files without special handling
+                df.columns = [clean_column_name(col) for col in df.columns]
+                return df
         else:
             logging.warning(f"Unsupported file type: {ext}")
             return None
         
-        # Clean column names for files without special handling
-        if base_name != 'tmb2022.tsv' and ext != '.cns' and 'segments.called.named.tsv' not in base_name and 'mean_gene_coverage.tsv' not in base_name and 'run_mastervarfinal.txt' not in base_name:
-            df.columns = [clean_column_name(col) for col in df.columns]
-        return df
+        if chunksize:
+            return (shape(chunk) for chunk in frames)
+        return shape(frames)
     
     except Exception as e:
         logging.error(f"Error reading file {file_path}: {str(e)}")
         return None
 
-def validate_and_clean_data(df, table_name):
+def validate_and_clean_data(df, table_name, upload_timestamp=None, seen_hashes=None, row_offset=0):
     """
     Enhanced validation and cleaning of DataFrame.
+    
+    When a file is cleaned chunk by chunk, pass the same upload_timestamp for every
+    chunk and a shared seen_hashes list so duplicates are detected across chunks, and
+    pass the number of rows in the preceding chunks as row_offset so that the 'index'
+    of a dropped record is its row in the file rather than in the chunk.
     """
     if df is None or df.empty:
         return None, None
         
-    dropped_records = []
     original_count = len(df)
     
     # Reset index for error reporting
@@ -220,65 +361,85 @@ def validate_and_clean_data(df, table_name):
     schema = get_table_schema(table_type)
     
     # Add metadata columns
-    df['upload_timestamp'] = datetime.now()
-    df['record_hash'] = df.apply(generate_record_hash, axis=1)
-    
-    # Validate and standardize each row
-    cleaned_rows = []
-    for idx, row in df.iterrows():
-        invalid_columns = []
-        standardized_row = {}
-        
-        for col, val in row.items():
-            if col in schema:
-                # Standardize value
-                std_val = standardize_value(val, col, schema[col])
-                
-                # Validate value
-                if schema[col].get('required', False) and std_val is None:
-                    invalid_columns.append(f"{col}: Required field is null")
-                elif std_val is not None:
-                    # Type validation
-                    if not isinstance(std_val, schema[col]['type']):
-                        invalid_columns.append(f"{col}: Invalid type")
-                    # Pattern validation for strings
-                    elif schema[col]['type'] == str and 'pattern' in schema[col]:
-                        if not re.match(schema[col]['pattern'], std_val):
-                            invalid_columns.append(f"{col}: Does not match pattern {schema[col]['pattern']}")
-                    # Range validation for numbers
-                    elif schema[col]['type'] in (int, float):
-                        if 'min' in schema[col] and std_val < schema[col]['min']:
-                            invalid_columns.append(f"{col}: Below minimum value {schema[col]['min']}")
-                        if 'max' in schema[col] and std_val > schema[col]['max']:
-                            invalid_columns.append(f"{col}: Above maximum value {schema[col]['max']}")
-                
-                standardized_row[col] = std_val
-            else:
-                standardized_row[col] = val
+    df['upload_timestamp'] = upload_timestamp or datetime.now()
+    
+    # Validate and standardize each column, collecting a mask per failed rule
+    standardized_df = df.copy()
+    failures = []
+    for col in df.columns:
+        if col not in schema:
+            continue
+        rules = schema[col]
+        values = standardize_column(df[col], col, rules)
+        standardized_df[col] = values
         
-        if invalid_columns:
-            dropped_records.append({
-                'index': idx,
-                'reason': f"Invalid values in columns: {', '.join(invalid_columns)}",
-                **row.to_dict()
-            })
-        else:
-            cleaned_rows.append(standardized_row)
+        missing = values.isna().to_numpy()
+        if rules.get('required', False):
+            failures.append((missing, f"{col}: Required field is null"))
+        
+        # Pattern validation for strings
+        if rules['type'] == str and 'pattern' in rules:
+            matches = pattern_matches(values, rules['pattern'])
+            failures.append((~missing & ~matches, f"{col}: Does not match pattern {rules['pattern'].pattern}"))
+        # Range validation for numbers
+        elif rules['type'] in (int, float):
+            if 'min' in rules:
+                below = (values < rules['min']).fillna(False).to_numpy(dtype=bool)
+                failures.append((below, f"{col}: Below minimum value {rules['min']}"))
+            if 'max' in rules:
+                above = (values > rules['max']).fillna(False).to_numpy(dtype=bool)
+                failures.append((above, f"{col}: Above maximum value {rules['max']}"))
+    
+    bad_mask = np.zeros(len(df), dtype=bool)
+    for mask, _ in failures:
+        bad_mask |= mask
     
-    # Create new DataFrame from cleaned rows
-    cleaned_df = pd.DataFrame(cleaned_rows) if cleaned_rows else None
-    dropped_df = pd.DataFrame(dropped_records) if dropped_records else None
+    # Split into cleaned and dropped DataFrames
+    cleaned_df = None
+    if not bad_mask.all():
+        # Only records that passed validation need a fingerprint for the UNIQUE index
+        cleaned_df = standardized_df[~bad_mask].reset_index(drop=True)
+        cleaned_df['_rh_u64'] = generate_record_hashes(df[~bad_mask]).to_numpy()
+    dropped_df = None
+    if bad_mask.any():
+        # Build the drop reason only for the rows that failed
+        invalid_columns = pd.Series('', index=df.index[bad_mask], dtype=object)
+        for mask, message in failures:
+            hit = mask[bad_mask]
+            separator = np.where(invalid_columns[hit] == '', '', ', ')
+            invalid_columns[hit] = invalid_columns[hit] + separator + message
+        
+        dropped_df = df[bad_mask].copy()
+        dropped_df.insert(0, 'reason', "Invalid values in columns: " + invalid_columns)
+        dropped_df.insert(0, 'index', row_offset + dropped_df.index)
+        # Invalid records are not fingerprinted, but every dropped batch must carry the
+        # same columns as the duplicates so they can share one dropped-records table
+        dropped_df['record_hash'] = pd.array([pd.NA] * len(dropped_df), dtype='Int64')
+        dropped_df = dropped_df.reset_index(drop=True)
     
-    # Check for duplicates using record_hash
+    # Check for duplicates on the raw 64-bit hashes in a single pass
     if cleaned_df is not None and not cleaned_df.empty:
-        duplicates = cleaned_df[cleaned_df.duplicated(subset=['record_hash'], keep='first')]
-        if not duplicates.empty:
+        duplicate_mask = cleaned_df['_rh_u64'].duplicated(keep='first').to_numpy(copy=True)
+        if seen_hashes is not None:
+            # seen_hashes holds the hashes kept from earlier chunks as one sorted uint64
+            # array, 8 bytes per record, so lookups and updates stay vectorised
+            hashes = cleaned_df['_rh_u64'].to_numpy()
+            seen = seen_hashes[0] if seen_hashes else np.empty(0, dtype=np.uint64)
+            if len(seen):
+                positions = np.minimum(np.searchsorted(seen, hashes), len(seen) - 1)
+                duplicate_mask |= seen[positions] == hashes
+            # The stable sort (timsort) reuses the already sorted run of earlier hashes
+            seen_hashes[:] = [np.sort(np.concatenate([seen, hashes[~duplicate_mask]]), kind='stable')]
+        if duplicate_mask.any():
+            duplicates = encode_record_hashes(cleaned_df[duplicate_mask]).assign(reason="Duplicate record")
+            # cleaned_df was renumbered after the invalid rows were removed
+            duplicates.insert(0, 'index', row_offset + np.flatnonzero(~bad_mask)[duplicate_mask])
             logging.warning(f"Found {len(duplicates)} duplicate records in {table_name}")
-            dropped_df = pd.concat([
-                dropped_df,
-                duplicates.assign(reason="Duplicate record")
-            ]) if dropped_df is not None else duplicates.assign(reason="Duplicate record")
-            cleaned_df = cleaned_df.drop_duplicates(subset=['record_hash'], keep='first')
+            dropped_df = pd.concat([dropped_df, duplicates]) if dropped_df is not None else duplicates
+            cleaned_df = cleaned_df[~duplicate_mask]
+    
+    if cleaned_df is not None:
+        cleaned_df = encode_record_hashes(cleaned_df)
     
     # Log summary
     final_count = len(cleaned_df) if cleaned_df is not None else 0
@@ -296,7 +457,7 @@ def validate_and_clean_data(df, table_name):
     
     return cleaned_df, dropped_df
 
-def verify_upload(df, table_name, engine):
+def verify_upload(df, table_name, engine, max_hashes=10000):
     """
     Verify that all records from the DataFrame were successfully uploaded to the database.
     
@@ -304,40 +465,56 @@ def verify_upload(df, table_name, engine):
         df (pandas.DataFrame): Original DataFrame that was uploaded
         table_name (str): Name of the table in the database
         engine (sqlalchemy.engine.Engine): Database engine connection
+        max_hashes (int): Most record hashes to look up; larger uploads are checked
+            against a random subsample of this size
         
     Returns:
         bool: True if verification passes, False otherwise
     """
     try:
-        # Get the count from the database
-        db_count = pd.read_sql(f'SELECT COUNT(*) as count FROM {table_name}', engine).iloc[0]['count']
-        
         # Get the count from the DataFrame
         df_count = len(df)
         
-        # Compare counts
-        if db_count != df_count:
-            logging.error(f"Verification failed for {table_name}: DataFrame has {df_count} records but database has {db_count} records")
-            return False
+        # Cheap sanity number from the statistics collector rather than a full COUNT(*)
+        live_rows = pd.read_sql(
+            text("SELECT n_live_tup AS count FROM pg_stat_user_tables WHERE relname = :table_name"),
+            engine,
+            params={'table_name': table_name}
+        )
+        if not live_rows.empty:
+            logging.info(f"Approximately {live_rows.iloc[0]['count']} live records in {table_name}")
             
-        # Sample check - verify a few random records exist in the database
-        sample_size = min(5, len(df))  # Check up to 5 random records
-        if sample_size > 0:
-            sample_records = df.sample(n=sample_size)
+        if df_count > 0 and 'record_hash' in df.columns:
+            # Look every uploaded record up at once through the record_hash index
+            hashes = df['record_hash'].drop_duplicates()
+            if len(hashes) > max_hashes:
+                hashes = hashes.sample(n=max_hashes)
+            query = text(f"SELECT COUNT(*) as count FROM {table_name} WHERE record_hash = ANY(:hashes)")
+            result = pd.read_sql(query, engine, params={'hashes': hashes.tolist()})
+            missing = len(hashes) - result.iloc[0]['count']
+            if missing > 0:
+                logging.error(f"Verification failed for {table_name}: {missing} of {len(hashes)} checked records not found in database")
+                return False
+        elif df_count > 0:
+            # Without a hash, check a few random records column by column
+            sample_records = df.sample(n=min(5, df_count))
             
             for _, record in sample_records.iterrows():
-                # Construct WHERE clause based on all columns
+                # Construct WHERE clause based on all columns, binding values as parameters
                 where_conditions = []
-                for column in record.index:
-                    if pd.isna(record[column]):
+                params = {}
+                for i, column in enumerate(record.index):
+                    value = record[column]
+                    if pd.isna(value):
                         where_conditions.append(f"{column} IS NULL")
                     else:
-                        where_conditions.append(f"{column} = '{str(record[column]).replace("'", "''")}'")
+                        where_conditions.append(f"{column} = :p{i}")
+                        params[f"p{i}"] = value.item() if isinstance(value, np.generic) else value
                 
                 where_clause = ' AND '.join(where_conditions)
-                query = f"SELECT COUNT(*) as count FROM {table_name} WHERE {where_clause}"
+                query = text(f"SELECT COUNT(*) as count FROM {table_name} WHERE {where_clause}")
                 
-                result = pd.read_sql(query, engine)
+                result = pd.read_sql(query, engine, params=params)
                 if result.iloc[0]['count'] == 0:
                     logging.error(f"Verification failed: Record not found in database for {table_name}")
                     return False
@@ -349,32 +526,412 @@ def verify_upload(df, table_name, engine):
         logging.error(f"Error during verification for {table_name}: {str(e)}")
         return False
 
-def upload_to_database(df, table_name, engine):
-    """Upload DataFrame to database and verify the upload"""
-    try:
-        if df is None or df.empty:
-            logging.warning(f"No data to upload for table {table_name}")
+# Tables known to exist, keyed by (database URL, table name). Tables are never dropped
+# during a run, so positive lookups can be cached for the life of the process.
+_existing_tables = set()
+
+def cache_existing_tables(engine):
+    """Record every table currently in the database with one catalog query"""
+    url = str(engine.url)
+    _existing_tables.update((url, name) for name in sqlalchemy.inspect(engine).get_table_names())
+
+def table_exists(table_name, engine):
+    """Check whether a table exists, consulting the catalog only for tables not seen yet"""
+    key = (str(engine.url), table_name)
+    if key not in _existing_tables:
+        if not sqlalchemy.inspect(engine).has_table(table_name):
             return False
+        _existing_tables.add(key)
+    return True
+
+def create_table_if_missing(df, table_name, engine):
+    """
+    Create a table from the DataFrame's columns if it does not exist yet.
+    
+    Workers loading files for the same new table race to create it; losing that race
+    is not an error as long as the table exists afterwards.
+    """
+    if not table_exists(table_name, engine):
+        try:
+            df.head(0).to_sql(table_name, engine, index=False)
+        except (ValueError, sqlalchemy.exc.DBAPIError):
+            if not sqlalchemy.inspect(engine).has_table(table_name):
+                raise
+        _existing_tables.add((str(engine.url), table_name))
+
+class CSVChunkStream(io.TextIOBase):
+    """
+    Read-only file object that renders DataFrame chunks as CSV on demand.
+    
+    Lets a single COPY FROM STDIN consume a stream of chunks without holding
+    more than one serialised chunk in memory.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._current = io.StringIO()
+        self.rows = 0
+    
+    def readable(self):
+        return True
+    
+    def read(self, size=-1):
+        while True:
+            data = self._current.read(size)
+            if data:
+                return data
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return ''
+            self.rows += len(chunk)
+            self._current = io.StringIO(chunk.to_csv(index=False, header=False, na_rep='\\N'))
+
+def copy_chunks_to_postgres(chunks, table_name, engine):
+    """
+    Bulk load DataFrame chunks into a table through a single PostgreSQL COPY FROM STDIN.
+    
+    All chunks must have the same columns as the first one. The table is created from
+    the first chunk's columns if it does not exist yet, matching the behaviour of
+    DataFrame.to_sql(if_exists='append').
+    
+    Args:
+        chunks (iterable): DataFrames to load
+        table_name (str): Name of the target table
+        engine (sqlalchemy.engine.Engine): Database engine
             
-        # Clean and validate data before upload
-        cleaned_df, dropped_df = validate_and_clean_data(df, table_name)
+    Returns:
+        int: Number of rows loaded
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return 0
+    
+    create_table_if_missing(first, table_name, engine)
+    conn = engine.raw_connection()
+    
+    stream = CSVChunkStream(itertools.chain([first], chunks))
+    columns = ', '.join(f'"{col}"' for col in first.columns)
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH CSV NULL '\\N'", stream)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return stream.rows
+
+def psql_copy(table, conn, keys, data_iter):
+    """
+    DataFrame.to_sql insertion method that loads rows with COPY FROM STDIN.
+    
+    Args:
+        table (pandas.io.sql.SQLTable): Target table
+        conn (sqlalchemy.engine.Connection): Connection to load through
+        keys (list): Column names
+        data_iter (iterable): Rows of values
+    """
+    buf = io.StringIO()
+    csv.writer(buf).writerows(data_iter)
+    buf.seek(0)
+    
+    table_name = f'"{table.schema}"."{table.name}"' if table.schema else f'"{table.name}"'
+    columns = ', '.join(f'"{key}"' for key in keys)
+    with conn.connection.cursor() as cur:
+        cur.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH CSV", buf)
+
+def copy_df_to_postgres(df, table_name, engine):
+    """
+    Bulk load a DataFrame into a table using PostgreSQL COPY FROM STDIN.
+    """
+    return copy_chunks_to_postgres([df], table_name, engine)
+
+def binary_copy_chunks_to_postgres(chunks, table_name, engine):
+    """
+    Bulk load DataFrame chunks into a table using PostgreSQL's binary COPY format.
+    
+    Values are sent in their binary wire representation, so the server skips parsing
+    text for every numeric field. Requires the optional pgcopy package. The table is
+    created from the first chunk's columns if it does not exist yet.
+    
+    Returns:
+        int: Number of rows loaded
+    """
+    if CopyManager is None:
+        raise RuntimeError("Binary COPY requires the pgcopy package")
+    
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return 0
+    create_table_if_missing(first, table_name, engine)
+    
+    rows = 0
+    conn = engine.raw_connection()
+    try:
+        # pgcopy reads the column types from the catalog once and encodes every chunk
+        manager = CopyManager(conn.dbapi_connection, table_name, list(first.columns))
+        for chunk in itertools.chain([first], chunks):
+            records = chunk.astype(object).where(chunk.notna(), None)
+            manager.copy(records.itertuples(index=False, name=None))
+            rows += len(chunk)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return rows
+
+def load_via_unlogged_staging(load_chunks, chunks, table_name, engine):
+    """
+    Load chunks into an UNLOGGED staging table, then move them into the target in one statement.
+    
+    The COPY into the staging table writes no WAL, and a load that fails part way leaves
+    nothing behind in the live table. The rows are appended to the target with a single
+    server-side INSERT ... SELECT once the whole file has loaded.
+    
+    Args:
+        load_chunks (callable): Loader such as copy_chunks_to_postgres
+        chunks (iterable): DataFrames to load
+        table_name (str): Name of the target table
+        engine (sqlalchemy.engine.Engine): Database engine
         
-        if cleaned_df is None or cleaned_df.empty:
-            logging.error(f"No valid data remaining after cleaning for table {table_name}")
+    Returns:
+        int: Number of rows loaded
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return 0
+    create_table_if_missing(first, table_name, engine)
+    
+    # One staging table per process, since workers may load the same table concurrently
+    staging_table = f"{table_name}_staging_{os.getpid()}"
+    columns = ', '.join(f'"{col}"' for col in first.columns)
+    try:
+        with engine.begin() as conn:
+            # Only the loaded columns, without constraints, defaults or indexes
+            conn.execute(text(f"DROP TABLE IF EXISTS {staging_table}"))
+            conn.execute(text(f"CREATE UNLOGGED TABLE {staging_table} AS SELECT {columns} FROM {table_name} WITH NO DATA"))
+        rows = load_chunks(itertools.chain([first], chunks), staging_table, engine)
+        with engine.begin() as conn:
+            conn.execute(text(f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {staging_table}"))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {staging_table}"))
+        _existing_tables.discard((str(engine.url), staging_table))
+    return rows
+
+def get_partition_column(table_name, engine):
+    """
+    Return the partition key column of a table partitioned on a single column, else None.
+    """
+    if not table_exists(table_name, engine):
+        return None
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT a.attname
+            FROM pg_partitioned_table p
+            JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+            WHERE p.partrelid = CAST(:table_name AS regclass) AND p.partnatts = 1
+        """), {'table_name': table_name}).scalar()
+
+def load_partitions_concurrently(load_chunks, chunks, table_name, engine, partition_column, max_workers=4):
+    """
+    Split each chunk on the partition key and load the slices concurrently.
+    
+    Every slice goes through its own pooled connection, so the server runs one COPY per
+    partition in parallel instead of routing all rows through a single backend. Slices
+    commit independently: a failed load can leave other slices of the file loaded.
+    
+    Args:
+        load_chunks (callable): Loader such as copy_chunks_to_postgres
+        chunks (iterable): DataFrames to load
+        table_name (str): Name of the partitioned target table
+        engine (sqlalchemy.engine.Engine): Database engine
+        partition_column (str): Column the table is partitioned on
+        max_workers (int): Most slices loaded at once
+    
+    Returns:
+        int: Number of rows loaded
+    """
+    rows = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for chunk in chunks:
+            # Unquoted DDL folds column names to lower case, so match the key loosely
+            key = {col.lower(): col for col in chunk.columns}.get(partition_column.lower())
+            if key is None:
+                raise ValueError(f"Partition key {partition_column} missing from data for {table_name}")
+            futures = [
+                executor.submit(load_chunks, [part], table_name, engine)
+                for _, part in chunk.groupby(key, sort=False, observed=True)
+            ]
+            # Finish this chunk's slices before taking the next so memory stays bounded
+            for future in as_completed(futures):
+                rows += future.result()
+    return rows
+
+def insert_chunks_to_postgres(chunks, table_name, engine):
+    """
+    Load DataFrame chunks into a table with batched INSERTs in a single transaction.
+    
+    Fallback for when COPY cannot be used. Rows go through executemany, which the
+    engine's psycopg2 fast execution helpers turn into multi-row INSERT statements.
+    
+    Returns:
+        int: Number of rows loaded
+    """
+    rows = 0
+    with engine.begin() as conn:
+        for chunk in chunks:
+            chunk.to_sql(table_name, conn, if_exists='append', index=False, chunksize=10000)
+            rows += len(chunk)
+    return rows
+
+def drop_table_indexes(table_name, engine):
+    """
+    Drop unique constraints and secondary indexes on a table ahead of a bulk load.
+    
+    The primary key is left in place so the id sequence and row identity are unaffected.
+    
+    Args:
+        table_name (str): Name of the table in the database
+        engine (sqlalchemy.engine.Engine): Database engine connection
+        
+    Returns:
+        list: SQL statements that recreate the dropped constraints and indexes
+    """
+    if not table_exists(table_name, engine):
+        return []
+    
+    with engine.begin() as conn:
+        constraints = conn.execute(text("""
+            SELECT conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = CAST(:table_name AS regclass) AND contype = 'u'
+        """), {'table_name': table_name}).fetchall()
+        indexes = conn.execute(text("""
+            SELECT idx.relname, pg_get_indexdef(idx.oid)
+            FROM pg_index i
+            JOIN pg_class idx ON idx.oid = i.indexrelid
+            WHERE i.indrelid = CAST(:table_name AS regclass)
+              AND NOT i.indisprimary
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+        """), {'table_name': table_name}).fetchall()
+        
+        for name, _ in constraints:
+            conn.execute(text(f'ALTER TABLE {table_name} DROP CONSTRAINT "{name}"'))
+        for name, _ in indexes:
+            conn.execute(text(f'DROP INDEX "{name}"'))
+    
+    logging.info(f"Dropped {len(constraints)} constraints and {len(indexes)} indexes on {table_name} for bulk load")
+    return [f'ALTER TABLE {table_name} ADD CONSTRAINT "{name}" {definition}' for name, definition in constraints] + \
+           [definition for _, definition in indexes]
+
+def recreate_table_indexes(statements, engine):
+    """
+    Recreate constraints and indexes dropped by drop_table_indexes.
+    
+    Each statement runs on its own connection so index builds can proceed in parallel.
+    
+    Returns:
+        bool: True if every statement succeeded, False otherwise
+    """
+    if not statements:
+        return True
+    
+    def run(statement):
+        with engine.begin() as conn:
+            conn.execute(text(statement))
+    
+    success = True
+    with ThreadPoolExecutor(max_workers=min(len(statements), multiprocessing.cpu_count())) as executor:
+        futures = {executor.submit(run, statement): statement for statement in statements}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                success = False
+                logging.error(f"Failed to recreate index with '{futures[future]}': {str(e)}")
+    return success
+
+def upload_to_database(df, table_name, engine, use_copy=True, copy_format='csv', unlogged_staging=False,
+                       copy_workers=1):
+    """
+    Upload DataFrame to database and verify the upload.
+    
+    df may also be an iterator of DataFrame chunks (see read_file's chunksize). Each
+    chunk is validated as it is consumed and all chunks are streamed through one COPY.
+    
+    With use_copy=False, rows are loaded with batched INSERTs instead of COPY;
+    otherwise copy_format picks the 'csv' or 'binary' COPY format. With
+    unlogged_staging, rows are loaded into an UNLOGGED staging table first and
+    appended to the target once complete. If the target is partitioned and
+    copy_workers > 1, the partitions are loaded concurrently (see
+    load_partitions_concurrently).
+    """
+    try:
+        if df is None or (isinstance(df, pd.DataFrame) and df.empty):
+            logging.warning(f"No data to upload for table {table_name}")
             return False
         
+        chunks = [df] if isinstance(df, pd.DataFrame) else df
+        upload_timestamp = datetime.now()
+        seen_hashes = []
+        uploaded_hashes = []
+        dropped_chunks = []
+        
+        def cleaned_chunks():
+            # Clean and validate data as it streams into the COPY
+            row_offset = 0
+            for chunk in chunks:
+                cleaned_df, dropped_df = validate_and_clean_data(chunk, table_name, upload_timestamp, seen_hashes,
+                                                                 row_offset)
+                row_offset += len(chunk)
+                # Tables are created with unquoted DDL, which folds column names to lower
+                # case, so load under the lower-case names as well
+                if dropped_df is not None and not dropped_df.empty:
+                    dropped_chunks.append(dropped_df.rename(columns=clean_column_name))
+                if cleaned_df is not None and not cleaned_df.empty:
+                    cleaned_df = cleaned_df.rename(columns=clean_column_name)
+                    uploaded_hashes.append(cleaned_df['record_hash'].to_numpy(dtype=np.int64))
+                    yield cleaned_df
+        
         # Upload cleaned data to database
-        cleaned_df.to_sql(table_name, engine, if_exists='append', index=False)
+        if not use_copy:
+            load_chunks = insert_chunks_to_postgres
+        elif copy_format == 'binary':
+            load_chunks = binary_copy_chunks_to_postgres
+        else:
+            load_chunks = copy_chunks_to_postgres
+        partition_column = None
+        if copy_workers > 1 and not unlogged_staging:
+            partition_column = get_partition_column(table_name, engine)
+        if unlogged_staging:
+            uploaded_count = load_via_unlogged_staging(load_chunks, cleaned_chunks(), table_name, engine)
+        elif partition_column:
+            uploaded_count = load_partitions_concurrently(load_chunks, cleaned_chunks(), table_name, engine,
+                                                          partition_column, max_workers=copy_workers)
+        else:
+            uploaded_count = load_chunks(cleaned_chunks(), table_name, engine)
+        
+        if uploaded_count == 0:
+            logging.error(f"No valid data remaining after cleaning for table {table_name}")
+            return False
         
         # Save dropped records to a separate table if there are any
-        if dropped_df is not None and not dropped_df.empty:
+        if dropped_chunks:
+            dropped_df = pd.concat(dropped_chunks, ignore_index=True)
             dropped_table = f"{table_name}_dropped_records"
-            dropped_df.to_sql(dropped_table, engine, if_exists='append', index=False)
+            dropped_df.to_sql(dropped_table, engine, if_exists='append', index=False, method=psql_copy)
             logging.info(f"Saved {len(dropped_df)} dropped records to {dropped_table}")
         
         # Verify the upload
-        if verify_upload(cleaned_df, table_name, engine):
-            logging.info(f"Successfully uploaded and verified {len(cleaned_df)} records to {table_name}")
+        uploaded_df = pd.DataFrame({'record_hash': np.concatenate(uploaded_hashes)})
+        if verify_upload(uploaded_df, table_name, engine):
+            logging.info(f"Successfully uploaded and verified {uploaded_count} records to {table_name}")
             return True
         else:
             logging.error(f"Upload verification failed for {table_name}")
@@ -384,75 +941,101 @@ def upload_to_database(df, table_name, engine):
         logging.error(f"Error uploading to database for table {table_name}: {str(e)}")
         return False
 
-def process_file_chunk(chunk_data):
-    """Process a chunk of data for parallel processing"""
-    df, table_name, engine = chunk_data
-    try:
-        df.to_sql(table_name, engine, if_exists='append', index=False)
-        return True, None
-    except Exception as e:
-        return False, str(e)
+# Distinct values tracked per column for QC; past this the count is reported as a lower bound
+QC_MAX_TRACKED_UNIQUE = 100000
 
-def parallel_upload(df, table_name, engine, chunk_size=10000):
-    """Upload data in parallel using chunks"""
-    if len(df) < chunk_size:
-        return upload_to_database(df, table_name, engine)
+def update_qc_accumulators(chunk, qc_state):
+    """
+    Fold one chunk into running QC statistics.
     
-    chunks = [df[i:i + chunk_size] for i in range(0, len(df), chunk_size)]
-    chunk_data = [(chunk, table_name, engine) for chunk in chunks]
+    Lets a QC report be built for a file that is streamed in chunks, without ever
+    holding the whole file in memory. Start from an empty dict and pass the result
+    to finalize_qc_report once every chunk has been seen. Distinct values are counted
+    exactly up to QC_MAX_TRACKED_UNIQUE per column, so the state stays bounded.
+    """
+    qc_state['record_count'] = qc_state.get('record_count', 0) + len(chunk)
+    columns = qc_state.setdefault('columns', {})
+    missing = chunk.isnull().sum()
     
-    with ThreadPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
-        futures = [executor.submit(process_file_chunk, data) for data in chunk_data]
+    for column in chunk.columns:
+        values = chunk[column]
+        stats = columns.setdefault(column, {
+            'dtype': str(values.dtype), 'missing_count': 0, 'hashes': set(),
+            'count': 0, 'mean': 0.0, 'm2': 0.0, 'min': None, 'max': None
+        })
+        stats['missing_count'] += int(missing[column])
         
-        success = True
-        errors = []
+        present = values.dropna()
+        if present.empty:
+            continue
+        # Distinct values are tracked by their 64-bit hashes; once a column has more than
+        # QC_MAX_TRACKED_UNIQUE of them the set is dropped and only the bound is reported
+        if stats['hashes'] is not None:
+            stats['hashes'].update(pd.util.hash_pandas_object(present, index=False).unique().tolist())
+            if len(stats['hashes']) > QC_MAX_TRACKED_UNIQUE:
+                stats['hashes'] = None
         
-        with tqdm(total=len(chunks), desc=f"Uploading {table_name}") as pbar:
-            for future in as_completed(futures):
-                result, error = future.result()
-                if not result:
-                    success = False
-                    errors.append(error)
-                pbar.update(1)
-        
-        if not success:
-            logging.error(f"Errors during parallel upload: {'; '.join(errors)}")
-        
-        return success
+        if pd.api.types.is_numeric_dtype(values):
+            # Merge this chunk's moments into the running ones (Chan et al.'s parallel update)
+            numbers = present.to_numpy(dtype=np.float64)
+            count, mean = len(numbers), numbers.mean()
+            # Sum of squared deviations as a dot product: one temporary, one BLAS pass
+            deviations = numbers - mean
+            m2 = float(np.dot(deviations, deviations))
+            total = stats['count'] + count
+            delta = mean - stats['mean']
+            stats['mean'] += delta * count / total
+            stats['m2'] += m2 + delta ** 2 * stats['count'] * count / total
+            stats['count'] = total
+            
+            chunk_min, chunk_max = present.min(), present.max()
+            stats['min'] = chunk_min if stats['min'] is None else min(stats['min'], chunk_min)
+            stats['max'] = chunk_max if stats['max'] is None else max(stats['max'], chunk_max)
 
-def generate_qc_report(df, table_name, output_dir):
-    """Generate a quality control report for the data"""
+def finalize_qc_report(qc_state, table_name, output_dir):
+    """
+    Write the QC report for statistics gathered by update_qc_accumulators.
+    
+    Medians are left out because they cannot be computed from streamed chunks. Columns
+    with more than QC_MAX_TRACKED_UNIQUE distinct values report their unique count as
+    the string ">QC_MAX_TRACKED_UNIQUE".
+    """
+    columns = qc_state.get('columns', {})
+    unique_counts = {
+        col: len(stats['hashes']) if stats['hashes'] is not None else f">{QC_MAX_TRACKED_UNIQUE}"
+        for col, stats in columns.items()
+    }
     report = {
         'table_name': table_name,
         'timestamp': datetime.now().isoformat(),
-        'record_count': len(df),
+        'record_count': qc_state.get('record_count', 0),
         'column_stats': {},
         'data_quality': {
-            'missing_values': df.isnull().sum().to_dict(),
-            'unique_values': {col: df[col].nunique() for col in df.columns},
+            'missing_values': {col: stats['missing_count'] for col, stats in columns.items()},
+            'unique_values': unique_counts,
         }
     }
     
-    # Calculate column statistics
-    for column in df.columns:
+    for column, stats in columns.items():
         col_stats = {
-            'dtype': str(df[column].dtype),
-            'unique_count': df[column].nunique(),
-            'missing_count': df[column].isnull().sum()
+            'dtype': stats['dtype'],
+            'unique_count': unique_counts[column],
+            'missing_count': stats['missing_count']
         }
-        
-        if df[column].dtype in ['int64', 'float64']:
+        if stats['count']:
             col_stats.update({
-                'mean': df[column].mean(),
-                'median': df[column].median(),
-                'std': df[column].std(),
-                'min': df[column].min(),
-                'max': df[column].max()
+                'mean': stats['mean'],
+                'std': (stats['m2'] / (stats['count'] - 1)) ** 0.5 if stats['count'] > 1 else None,
+                'min': stats['min'],
+                'max': stats['max']
             })
         
         report['column_stats'][column] = col_stats
     
-    # Save report
+    return save_qc_report(report, table_name, output_dir)
+
+def save_qc_report(report, table_name, output_dir):
+    """Save a QC report as JSON and return its path"""
     report_path = os.path.join(output_dir, f"{table_name}_qc_report.json")
     with open(report_path, 'w') as f:
         json.dump(report, f, indent=2, default=str)
@@ -465,12 +1048,13 @@ def backup_table(table_name, engine, backup_dir):
     backup_file = os.path.join(backup_dir, f"{table_name}_backup_{timestamp}.csv")
     
     try:
-        # Read existing table
-        query = f"SELECT * FROM {table_name}"
-        df = pd.read_sql(query, engine)
-        
-        # Save to CSV
-        df.to_csv(backup_file, index=False)
+        # Stream the table straight from the server into the CSV file
+        conn = engine.raw_connection()
+        try:
+            with conn.cursor() as cur, open(backup_file, 'wb') as f:
+                cur.copy_expert(f"COPY {table_name} TO STDOUT WITH CSV HEADER", f)
+        finally:
+            conn.close()
         logging.info(f"Backup created: {backup_file}")
         return backup_file
     except Exception as e:
@@ -484,24 +1068,24 @@ def validate_database_schema(engine):
             CREATE TABLE IF NOT EXISTS tmb_data (
                 id SERIAL PRIMARY KEY,
                 SampleName VARCHAR(255) NOT NULL,
-                TMB FLOAT NOT NULL,
-                BinomialLow FLOAT,
-                BinomialHigh FLOAT,
+                TMB REAL NOT NULL,
+                BinomialLow REAL,
+                BinomialHigh REAL,
                 upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                record_hash VARCHAR(32) UNIQUE
+                record_hash BIGINT UNIQUE
             )
         ''',
         'cns_data': '''
             CREATE TABLE IF NOT EXISTS cns_data (
                 id SERIAL PRIMARY KEY,
                 SampleName VARCHAR(255) NOT NULL,
-                CHROM VARCHAR(50) NOT NULL,
+                CHROM SMALLINT NOT NULL,
                 START INTEGER NOT NULL,
                 STOP INTEGER NOT NULL,
                 GENE VARCHAR(255),
-                log2 FLOAT,
+                log2 REAL,
                 upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                record_hash VARCHAR(32) UNIQUE
+                record_hash BIGINT UNIQUE
             )
         '''
         # Add other table definitions as needed
@@ -527,21 +1111,35 @@ def get_default_file_patterns():
         'segments': ['*segments.called.named.tsv']
     }
 
-def find_files(directory, patterns=None):
+def find_files(directory, patterns=None, warn_unmatched=False):
     """
     Find files matching the given patterns in the directory.
     If no patterns provided, use default patterns.
+    
+    The directory is listed once and every pattern is matched against that listing,
+    rather than globbing (and re-reading the directory) once per pattern.
     """
     if patterns is None:
         patterns = []
         for file_patterns in get_default_file_patterns().values():
             patterns.extend(file_patterns)
     
+    with os.scandir(directory) as entries:
+        names = [entry.name for entry in entries]
+    # Like glob, wildcards do not match hidden files
+    visible_names = [name for name in names if not name.startswith('.')]
+    
     found_files = []
     for pattern in patterns:
-        # Use glob to find files matching pattern
-        pattern_path = os.path.join(directory, pattern)
-        found_files.extend(glob.glob(pattern_path))
+        if os.sep in pattern or (os.altsep and os.altsep in pattern):
+            # Patterns reaching into subdirectories still need a real glob
+            matching_files = glob.glob(os.path.join(directory, pattern))
+        else:
+            candidates = names if pattern.startswith('.') else visible_names
+            matching_files = [os.path.join(directory, name) for name in fnmatch.filter(candidates, pattern)]
+        if warn_unmatched and not matching_files:
+            logging.warning(f"No files found matching pattern: {pattern}")
+        found_files.extend(matching_files)
     
     return found_files
 
@@ -625,7 +1223,7 @@ def send_email_report(config_file, report_data):
     
     try:
         # Create message
-        msg = MIMEMultipart()
+        msg = EmailMessage()
         msg['Subject'] = f"Genomic Data Upload Report - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
         msg['From'] = config['smtp']['sender']
         msg['To'] = ', '.join(config['recipients'])
@@ -657,14 +1255,13 @@ def send_email_report(config_file, report_data):
         </html>
         """
         
-        msg.attach(MIMEText(html_content, 'html'))
+        msg.set_content(html_content, subtype='html')
         
-        # Attach QC reports
+        # Attach QC reports, releasing each file's bytes once it is encoded into the message
         for report_file in report_data['qc_reports']:
             with open(report_file, 'rb') as f:
-                part = MIMEApplication(f.read(), Name=os.path.basename(report_file))
-                part['Content-Disposition'] = f'attachment; filename="{os.path.basename(report_file)}"'
-                msg.attach(part)
+                msg.add_attachment(f.read(), maintype='application', subtype='json',
+                                   filename=os.path.basename(report_file))
         
         # Send email
         with smtplib.SMTP(config['smtp']['server'], config['smtp']['port']) as server:
@@ -681,17 +1278,114 @@ def send_email_report(config_file, report_data):
         logging.error(f"Failed to send email report: {str(e)}")
         return False
 
+# Engine owned by each worker process and reused for every file it handles
+_worker_engine = None
+
+def init_worker(db_config, pool_size=1):
+    """
+    Load the database configuration and open the engine in a worker process.
+    
+    pool_size should be the number of connections a single upload may hold at once,
+    i.e. --copy-workers, so concurrent partition loads never wait on the pool.
+    """
+    global _worker_engine
+    DB_CONFIG.update(db_config)
+    # Engines hold pooled connections and must never be shared across processes
+    _worker_engine = create_db_engine(pool_size=pool_size)
+    # atexit handlers do not run in pool worker processes, multiprocessing finalizers do
+    Finalize(_worker_engine, _worker_engine.dispose, exitpriority=10)
+
+def _process_one(file_path, file_type, args):
+    """
+    Read, QC and upload a single file. Runs in a worker set up by init_worker.
+    
+    Args:
+        file_path (str): Path to the file
+        file_type (str): File type used to pick the target table
+        args (argparse.Namespace): Parsed command line options
+        
+    Returns:
+        tuple: (file_path, success, path to the QC report or None)
+    """
+    try:
+        logging.info(f"Processing file: {os.path.basename(file_path)}")
+        
+        # Stream the file in chunks, folding each one into the QC statistics on its way through
+        chunks = read_file(file_path, chunksize=args.chunk_size)
+        if chunks is None:
+            logging.error(f"Failed to read file: {file_path}")
+            return file_path, False, None
+        table_name = get_table_name(file_path, file_type)
+        
+        qc_state = {}
+        def checked_chunks(qc_pool):
+            # QC for each chunk runs in a thread while the chunk is validated and copied;
+            # waiting on the previous chunk's QC keeps at most one chunk in flight there
+            pending = None
+            for chunk in chunks:
+                if pending:
+                    pending.result()
+                pending = qc_pool.submit(update_qc_accumulators, chunk, qc_state)
+                yield chunk
+            if pending:
+                pending.result()
+        
+        with ThreadPoolExecutor(max_workers=1) as qc_pool:
+            if args.dry_run:
+                for _ in checked_chunks(qc_pool):
+                    pass
+                success = True
+            else:
+                # Backup existing table
+                backup_table(table_name, _worker_engine, args.backup_dir)
+                
+                # Upload data
+                success = upload_to_database(checked_chunks(qc_pool), table_name, _worker_engine,
+                                             use_copy=not args.insert_fallback,
+                                             copy_format=args.copy_format,
+                                             unlogged_staging=args.unlogged_staging,
+                                             copy_workers=args.copy_workers)
+        
+        # Generate QC report
+        qc_report = finalize_qc_report(qc_state, table_name, args.qc_dir)
+        logging.info(f"QC report generated: {qc_report}")
+        
+        if args.dry_run:
+            logging.info(f"Dry run - file {os.path.basename(file_path)} validated successfully")
+        elif success:
+            logging.info(f"Successfully processed {os.path.basename(file_path)}")
+        else:
+            logging.error(f"Failed to upload {os.path.basename(file_path)} to database")
+        return file_path, success, qc_report
+        
+    except Exception as e:
+        logging.error(f"Error processing file {file_path}: {str(e)}")
+        return file_path, False, None
+
 def main():
     parser = argparse.ArgumentParser(description='Upload genomic data files to database')
     parser.add_argument('directory', help='Directory containing the files to process')
     parser.add_argument('--files', nargs='*', help='Specific files to process. If not provided, will look for files with standard endings')
     parser.add_argument('--db-config', help='Path to database configuration file', default='db_config.json')
     parser.add_argument('--log-file', help='Path to log file', default='genomic_upload.log')
-    parser.add_argument('--parallel', action='store_true', help='Enable parallel processing for large files')
-    parser.add_argument('--chunk-size', type=int, default=10000, help='Chunk size for parallel processing')
+    parser.add_argument('--chunk-size', type=int, default=500000, help='Rows per chunk when streaming files into the database')
+    parser.add_argument('--workers', type=int, default=max(1, multiprocessing.cpu_count() // 2),
+                        help='Number of worker processes, each reading, checking and uploading one file at a time '
+                             '(use 1 to process files serially)')
     parser.add_argument('--backup-dir', help='Directory for table backups', default='backups')
     parser.add_argument('--qc-dir', help='Directory for QC reports', default='qc_reports')
     parser.add_argument('--dry-run', action='store_true', help='Validate files without uploading')
+    parser.add_argument('--drop-indexes-during-load', action='store_true',
+                        help='Drop unique constraints and indexes while loading and rebuild them afterwards')
+    parser.add_argument('--insert-fallback', action='store_true',
+                        help='Load rows with batched INSERT statements instead of COPY')
+    parser.add_argument('--copy-format', choices=['csv', 'binary'], default='csv',
+                        help='COPY format used to load rows (binary requires the pgcopy package)')
+    parser.add_argument('--unlogged-staging', action='store_true',
+                        help='Load each file into an UNLOGGED staging table before appending it to the target table')
+    parser.add_argument('--copy-workers', type=int, default=1,
+                        help='Concurrent COPY connections per file; values above 1 load the partitions '
+                             'of a partitioned target table concurrently')
     parser.add_argument('--email-config', help='Path to email configuration file')
     
     args = parser.parse_args()
@@ -723,6 +1417,10 @@ def main():
         logging.error(f"Invalid JSON in database config file {args.db_config}")
         return
     
+    if args.copy_format == 'binary' and CopyManager is None:
+        logging.error("--copy-format binary requires the pgcopy package (pip install pgcopy)")
+        return
+    
     # Validate directory
     if not os.path.isdir(args.directory):
         logging.error(f"Directory not found: {args.directory}")
@@ -731,13 +1429,7 @@ def main():
     # Find files to process
     if args.files:
         # Use provided files, but validate they exist
-        files_to_process = []
-        for file_pattern in args.files:
-            file_path = os.path.join(args.directory, file_pattern)
-            matching_files = glob.glob(file_path)
-            if not matching_files:
-                logging.warning(f"No files found matching pattern: {file_pattern}")
-            files_to_process.extend(matching_files)
+        files_to_process = find_files(args.directory, args.files, warn_unmatched=True)
     else:
         # Use default file patterns
         files_to_process = find_files(args.directory)
@@ -749,20 +1441,9 @@ def main():
     # Group files by type for organized processing
     file_groups = defaultdict(list)
     for file_path in files_to_process:
-        file_type = None
-        file_lower = file_path.lower()
-        
         # Determine file type
-        if 'tmb' in file_lower:
-            file_type = 'tmb'
-        elif file_lower.endswith('.cns'):
-            file_type = 'cns'
-        elif 'mean_gene_coverage' in file_lower:
-            file_type = 'coverage'
-        elif 'mastervarfinal' in file_lower:
-            file_type = 'mastervar'
-        elif 'segments.called.named' in file_lower:
-            file_type = 'segments'
+        match = _TYPE_RE.match(file_path.lower())
+        file_type = match.lastgroup if match else None
         
         if file_type:
             file_groups[file_type].append(file_path)
@@ -771,10 +1452,7 @@ def main():
     
     # Create database engine
     try:
-        engine = create_engine(
-            f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@"
-            f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-        )
+        engine = create_db_engine(pool_size=args.workers)
     except Exception as e:
         logging.error(f"Failed to connect to database: {str(e)}")
         return
@@ -782,53 +1460,46 @@ def main():
     # Validate database schema
     if not validate_database_schema(engine):
         return
-    
-    # Process each group of files
-    total_files = len(files_to_process)
-    processed_files = 0
-    failed_files = []
+    # Look the existing tables up once; forked workers inherit the cache
+    cache_existing_tables(engine)
     
     for file_type, files in file_groups.items():
-        logging.info(f"\nProcessing {file_type} files...")
-        for file_path in files:
-            try:
-                logging.info(f"Processing file: {os.path.basename(file_path)}")
-                df = read_file(file_path)
-                
-                if df is not None:
-                    table_name = get_table_name(file_path, file_type)
-                    
-                    # Generate QC report
-                    qc_report = generate_qc_report(df, table_name, args.qc_dir)
-                    qc_reports.append(qc_report)
-                    logging.info(f"QC report generated: {qc_report}")
-                    
-                    if not args.dry_run:
-                        # Backup existing table
-                        backup_file = backup_table(table_name, engine, args.backup_dir)
-                        
-                        # Upload data
-                        if args.parallel and len(df) > args.chunk_size:
-                            success = parallel_upload(df, table_name, engine, args.chunk_size)
-                        else:
-                            success = upload_to_database(df, table_name, engine)
-                        
-                        if success:
-                            processed_files.append(file_path)
-                            logging.info(f"Successfully processed {os.path.basename(file_path)}")
-                        else:
-                            failed_files.append(file_path)
-                            logging.error(f"Failed to upload {os.path.basename(file_path)} to database")
-                    else:
-                        processed_files.append(file_path)
-                        logging.info(f"Dry run - file {os.path.basename(file_path)} validated successfully")
-                else:
-                    failed_files.append(file_path)
-                    logging.error(f"Failed to read file: {file_path}")
-                    
-            except Exception as e:
+        logging.info(f"Processing {len(files)} {file_type} files...")
+    tasks = [(file_path, file_type) for file_type, files in file_groups.items() for file_path in files]
+    
+    # Indexes are dropped once per table around the whole run so that concurrent
+    # workers loading the same table never drop and rebuild them under each other
+    recreate_statements = []
+    if args.drop_indexes_during_load and not args.dry_run:
+        for table_name in {get_table_name(file_path, file_type) for file_path, file_type in tasks}:
+            recreate_statements.extend(drop_table_indexes(table_name, engine))
+    
+    # Each file is read, checked and uploaded independently in its own worker process
+    executor = None
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                       initargs=(DB_CONFIG, max(1, args.copy_workers)))
+    else:
+        init_worker(DB_CONFIG, max(1, args.copy_workers))
+    try:
+        if executor:
+            futures = [executor.submit(_process_one, file_path, file_type, args) for file_path, file_type in tasks]
+            results = (future.result() for future in as_completed(futures))
+        else:
+            results = (_process_one(file_path, file_type, args) for file_path, file_type in tasks)
+        
+        for file_path, success, qc_report in results:
+            if qc_report:
+                qc_reports.append(qc_report)
+            if success:
+                processed_files.append(file_path)
+            else:
                 failed_files.append(file_path)
-                logging.error(f"Error processing file {file_path}: {str(e)}")
+    finally:
+        if executor:
+            executor.shutdown()
+        if not recreate_table_indexes(recreate_statements, engine):
+            logging.error("Failed to rebuild all indexes dropped for loading")
     
     # Record end time
     end_time = datetime.now()
@@ -2,12 +2,50 @@ import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 from pycircos import Circos
 from Bio import SeqIO
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 import logging
 
+# hg38 chromosomes in display order; other contig names sort after these
+CHROM_CATEGORIES = [f'chr{c}' for c in [*map(str, range(1, 23)), 'X', 'Y', 'M']]
+
+def _chrom_label(value):
+    """Return the 'chr'-prefixed name for a chromosome given as a name or number"""
+    label = str(value)
+    if not label.startswith('chr'):
+        label = f'chr{label}'
+    return 'chrM' if label == 'chrMT' else label
+
+def chrom_categorical(values):
+    """
+    Convert a chromosome column to an ordered Categorical of 'chr'-prefixed names.
+    
+    Names are prefixed once per distinct value rather than once per row, and a
+    column that has already been converted is returned unchanged.
+    """
+    if (isinstance(values.dtype, pd.CategoricalDtype) and values.cat.ordered
+            and values.cat.categories[:len(CHROM_CATEGORIES)].tolist() == CHROM_CATEGORIES):
+        return values
+    
+    codes, uniques = pd.factorize(values)
+    labels = [_chrom_label(value) for value in uniques]
+    categories = CHROM_CATEGORIES + sorted(set(labels) - set(CHROM_CATEGORIES))
+    position = {label: i for i, label in enumerate(categories)}
+    # The trailing -1 keeps missing values (factorize code -1) missing
+    label_codes = np.array([position[label] for label in labels] + [-1])
+    return pd.Series(
+        pd.Categorical.from_codes(label_codes[codes], categories, ordered=True),
+        index=values.index,
+        name=values.name
+    )
+
+def _chrom_rows(df):
+    """Return the row positions of each chromosome in df, keyed by 'chr'-prefixed name"""
+    return df.groupby(chrom_categorical(df['chrom']), observed=True, sort=False).indices
+
 class GenomicVisualizer:
     def __init__(self, output_dir="visualizations"):
         """Initialize the visualizer with output directory"""
@@ -47,18 +85,28 @@ class GenomicVisualizer:
         
         try:
             # Prepare data in IGV format
-            igv_data = df.copy()
-            igv_data['chrom'] = 'chr' + igv_data['chrom'].astype(str)
+            # Segments without a chromosome cannot be placed on a track
+            igv_data = df[df['chrom'].notna()].copy()
+            igv_data['chrom'] = chrom_categorical(igv_data['chrom'])
             
-            # Sort by chromosome and position
+            # Sort by chromosome (in genome order, via the category codes) and position
             igv_data = igv_data.sort_values(['chrom', 'start_pos'])
             
+            # Build each segment's step line and value line for all rows at once; map(str)
+            # formats missing values as 'nan' like the row-by-row writer did, where
+            # astype(str) would leave them as float NaN
+            steps = (igv_data['stop_pos'] - igv_data['start_pos']).map(str)
+            lines = (
+                'fixedStep chrom=' + igv_data['chrom'].astype(str)
+                + ' start=' + igv_data['start_pos'].map(str)
+                + ' step=' + steps
+                + '\n' + igv_data['log2'].map(str) + '\n'
+            )
+            
             # Write header and data
             with open(output_file, 'w') as f:
                 f.write(header)
-                for _, row in igv_data.iterrows():
-                    f.write(f'fixedStep chrom={row["chrom"]} start={row["start_pos"]} step={row["stop_pos"]-row["start_pos"]}\n')
-                    f.write(f'{row["log2"]}\n')
+                f.write(''.join(lines))
             
             self.logger.info(f"IGV file created: {output_file}")
             return output_file
@@ -74,21 +122,17 @@ class GenomicVisualizer:
         
         try:
             # Prepare data in BED format
-            bed_data = df.copy()
-            bed_data['chrom'] = 'chr' + bed_data['chrom'].astype(str)
-            bed_data['name'] = bed_data.apply(
-                lambda x: f"CNV_{x['chrom']}:{x['start_pos']}-{x['stop_pos']}", 
-                axis=1
+            # Segments without a chromosome cannot be placed on a track
+            bed_data = df[df['chrom'].notna()].copy()
+            bed_data['chrom'] = chrom_categorical(bed_data['chrom'])
+            bed_data['name'] = (
+                'CNV_' + bed_data['chrom'].astype(str)
+                + ':' + bed_data['start_pos'].astype(str)
+                + '-' + bed_data['stop_pos'].astype(str)
             )
             
-            # Add RGB colors based on log2 values
-            def get_rgb(log2):
-                if log2 > 0:
-                    return "255,0,0"  # Red for amplifications
-                else:
-                    return "0,0,255"  # Blue for deletions
-            
-            bed_data['rgb'] = bed_data['log2'].apply(get_rgb)
+            # Add RGB colors based on log2 values: red for amplifications, blue for deletions
+            bed_data['rgb'] = np.where(bed_data['log2'].to_numpy() > 0, "255,0,0", "0,0,255")
             
             # Select and order columns for BED format
             bed_columns = [
@@ -137,19 +181,22 @@ class GenomicVisualizer:
             # Add base ideogram
             circos.add_sectors()
             
-            # Process CNV data
+            # Process CNV data: color every segment once, then partition the segments by
+            # chromosome in a single pass into row positions
+            starts = df['start_pos'].to_numpy()
+            stops = df['stop_pos'].to_numpy()
+            log2 = df['log2'].to_numpy()
+            segment_colors = np.where(log2 > 0, 'red', 'blue')
+            groups = _chrom_rows(df)
             for chrom in self.chrom_sizes.keys():
-                chrom_data = df[df['chrom'] == str(chrom)]
-                if len(chrom_data) > 0:
+                rows = groups.get(f'chr{chrom}')
+                if rows is not None and len(rows) > 0:
                     # Add CNV track
-                    positions = list(zip(
-                        chrom_data['start_pos'],
-                        chrom_data['stop_pos']
-                    ))
-                    values = chrom_data['log2'].values
+                    positions = list(zip(starts[rows], stops[rows]))
+                    values = log2[rows]
                     
-                    # Color coding
-                    colors = ['red' if v > 0 else 'blue' for v in values]
+                    # pycircos takes plain lists, so convert only at the API boundary
+                    colors = segment_colors[rows].tolist()
                     
                     circos.add_track(
                         f'chr{chrom}',
@@ -183,29 +230,27 @@ class GenomicVisualizer:
         
         try:
             # Filter data for chromosome
-            chrom_data = df[df['chrom'] == str(chrom)].sort_values('start_pos')
+            rows = _chrom_rows(df).get(_chrom_label(chrom), [])
+            chrom_data = df.iloc[rows].sort_values('start_pos')
             
             # Create plot
             plt.figure(figsize=(15, 5))
             
-            # Plot CNV segments
-            plt.plot(
-                [chrom_data['start_pos'], chrom_data['stop_pos']],
-                [chrom_data['log2'], chrom_data['log2']],
-                'b-', linewidth=2
-            )
+            # Plot CNV segments as a single collection rather than one line per segment
+            log2 = chrom_data['log2'].to_numpy(dtype=float)
+            segments = np.stack([
+                np.column_stack([chrom_data['start_pos'].to_numpy(dtype=float), log2]),
+                np.column_stack([chrom_data['stop_pos'].to_numpy(dtype=float), log2])
+            ], axis=1)
+            ax = plt.gca()
+            ax.add_collection(LineCollection(segments, colors='b', linewidths=2))
+            ax.autoscale()
             
             # Add genes if available
             if 'gene' in chrom_data.columns:
-                for _, row in chrom_data.iterrows():
-                    if pd.notna(row['gene']):
-                        plt.text(
-                            row['start_pos'],
-                            row['log2'],
-                            row['gene'],
-                            rotation=45,
-                            fontsize=8
-                        )
+                labeled = chrom_data.loc[chrom_data['gene'].notna(), ['start_pos', 'log2', 'gene']]
+                for start_pos, log2, gene in labeled.itertuples(index=False):
+                    plt.text(start_pos, log2, gene, rotation=45, fontsize=8)
             
             # Customize plot
             plt.title(f'Chromosome {chrom} Copy Number Profile')
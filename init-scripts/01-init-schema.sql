@@ -11,23 +11,23 @@ SET search_path TO genomic, public;
 CREATE TABLE IF NOT EXISTS genomic.tmb_data (
     id SERIAL PRIMARY KEY,
     sample_name VARCHAR(255) NOT NULL,
-    tmb FLOAT NOT NULL,
-    binomial_low FLOAT,
-    binomial_high FLOAT,
+    tmb REAL NOT NULL,
+    binomial_low REAL,
+    binomial_high REAL,
     upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    record_hash VARCHAR(32) UNIQUE
+    record_hash BIGINT UNIQUE
 );
 
 CREATE TABLE IF NOT EXISTS genomic.cns_data (
     id SERIAL PRIMARY KEY,
     sample_name VARCHAR(255) NOT NULL,
-    chrom VARCHAR(50) NOT NULL,
+    chrom SMALLINT NOT NULL,
     start_pos INTEGER NOT NULL,
     stop_pos INTEGER NOT NULL,
     gene VARCHAR(255),
-    log2 FLOAT,
+    log2 REAL,
     upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    record_hash VARCHAR(32) UNIQUE
+    record_hash BIGINT UNIQUE
 );
 
 -- Create indexes
@@ -3,17 +3,17 @@ import argparse
 import os
 import subprocess
 import time
+import socket
 import json
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
 def run_command(command, cwd=None):
-    """Run a shell command and return the output"""
+    """Run a command, given as an argument list, and return the output"""
     try:
         result = subprocess.run(
             command,
             cwd=cwd,
-            shell=True,
             check=True,
             text=True,
             capture_output=True
@@ -21,10 +21,12 @@ def run_command(command, cwd=None):
         return True, result.stdout
     except subprocess.CalledProcessError as e:
         return False, e.stderr
+    except FileNotFoundError:
+        return False, f"Command not found: {command[0]}"
 
 def check_docker():
     """Check if Docker is installed and running"""
-    success, output = run_command("docker info")
+    success, output = run_command(["docker", "info"])
     if not success:
         print("Error: Docker is not running or not installed")
         print("Please install Docker and Docker Compose, then start the Docker service")
@@ -32,23 +34,35 @@ def check_docker():
     return True
 
 def wait_for_postgres(host, port, user, password, dbname, max_retries=30):
-    """Wait for PostgreSQL to be ready"""
-    retry = 0
-    while retry < max_retries:
+    """Wait for PostgreSQL to be ready, for up to roughly max_retries seconds"""
+    deadline = time.monotonic() + max_retries
+    delay = 0.1
+    attempt = 0
+    while time.monotonic() < deadline:
+        attempt += 1
+        # Cheap TCP probe first so we only authenticate once the server is listening
         try:
-            conn = psycopg2.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                dbname=dbname
-            )
-            conn.close()
-            return True
-        except psycopg2.OperationalError:
-            retry += 1
-            print(f"Waiting for PostgreSQL to be ready... ({retry}/{max_retries})")
-            time.sleep(1)
+            socket.create_connection((host, port), timeout=1).close()
+            listening = True
+        except OSError:
+            listening = False
+        if listening:
+            try:
+                conn = psycopg2.connect(
+                    host=host,
+                    port=port,
+                    user=user,
+                    password=password,
+                    dbname=dbname,
+                    connect_timeout=5
+                )
+                conn.close()
+                return True
+            except psycopg2.OperationalError:
+                pass
+        print(f"Waiting for PostgreSQL to be ready... (attempt {attempt})")
+        time.sleep(min(delay, max(0, deadline - time.monotonic())))
+        delay = min(delay * 2, 4.0)
     return False
 
 def create_db_config(host, port, user, password, dbname):
@@ -74,7 +88,7 @@ def start_db(args):
     os.environ["DB_PASSWORD"] = args.password
 
     print("Starting PostgreSQL container...")
-    success, output = run_command("docker-compose up -d")
+    success, output = run_command(["docker-compose", "up", "-d"])
     if not success:
         print("Error starting containers:", output)
         return False
@@ -111,7 +125,7 @@ def start_db(args):
 def stop_db(args):
     """Stop the database containers"""
     print("Stopping PostgreSQL container...")
-    success, output = run_command("docker-compose down")
+    success, output = run_command(["docker-compose", "down"])
     if not success:
         print("Error stopping containers:", output)
         return False
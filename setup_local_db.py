@@ -9,11 +9,10 @@ import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
 def run_command(command):
-    """Run a shell command and return the output"""
+    """Run a command, given as an argument list, and return the output"""
     try:
         result = subprocess.run(
             command,
-            shell=True,
             check=True,
             text=True,
             capture_output=True
@@ -21,15 +20,17 @@ def run_command(command):
         return True, result.stdout
     except subprocess.CalledProcessError as e:
         return False, e.stderr
+    except FileNotFoundError:
+        return False, f"Command not found: {command[0]}"
 
 def check_postgres_installation():
     """Check if PostgreSQL is installed"""
-    success, _ = run_command("pg_config --version")
+    success, _ = run_command(["pg_config", "--version"])
     return success
 
 def get_postgres_version():
     """Get PostgreSQL version"""
-    success, output = run_command("pg_config --version")
+    success, output = run_command(["pg_config", "--version"])
     if success:
         return output.strip()
     return None
@@ -37,22 +38,22 @@ def get_postgres_version():
 def is_postgres_running():
     """Check if PostgreSQL service is running"""
     if sys.platform == 'win32':
-        success, _ = run_command('sc query "postgresql"')
+        success, _ = run_command(["sc", "query", "postgresql"])
         return success
     else:
-        success, _ = run_command('pg_isready')
+        success, _ = run_command(["pg_isready"])
         return success
 
 def start_postgres_service():
     """Start PostgreSQL service"""
     print("Starting PostgreSQL service...")
     if sys.platform == 'win32':
-        success, output = run_command('net start postgresql')
+        success, output = run_command(["net", "start", "postgresql"])
     else:
         if sys.platform == 'darwin':  # macOS
-            success, output = run_command('brew services start postgresql')
+            success, output = run_command(["brew", "services", "start", "postgresql"])
         else:  # Linux
-            success, output = run_command('sudo service postgresql start')
+            success, output = run_command(["sudo", "service", "postgresql", "start"])
     
     if not success:
         print("Failed to start PostgreSQL service:", output)
@@ -0,0 +1,164 @@
+import json
+import os
+import re
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+import genomic_data_upload as gdu
+
+
+def test_qc_unique_counts_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(gdu, 'QC_MAX_TRACKED_UNIQUE', 10)
+    qc_state = {}
+    for start in range(0, 40, 8):
+        chunk = pd.DataFrame({'POS': np.arange(start, start + 8), 'REF': ['A'] * 8})
+        gdu.update_qc_accumulators(chunk, qc_state)
+    assert qc_state['columns']['POS']['hashes'] is None
+
+    report_path = gdu.finalize_qc_report(qc_state, 'mastervar_data', str(tmp_path))
+    with open(report_path) as f:
+        report = json.load(f)
+    assert report['column_stats']['POS']['unique_count'] == '>10'
+    assert report['column_stats']['REF']['unique_count'] == 1
+
+
+def test_dropped_records_keep_their_file_row():
+    upload_timestamp = pd.Timestamp('2024-01-01')
+    seen_hashes = []
+    chunks = [
+        pd.DataFrame({'SampleName': ['S1', 'S2', 'S3'], 'TMB': [1.0, -1.0, 2.0],
+                      'BinomialLow': [0.1, 0.1, 0.1], 'BinomialHigh': [0.9, 0.9, 0.9]}),
+        pd.DataFrame({'SampleName': ['S4', 'S1', 'S5'], 'TMB': [-2.0, 1.0, 3.0],
+                      'BinomialLow': [0.1, 0.1, 0.1], 'BinomialHigh': [0.9, 0.9, 0.9]}),
+    ]
+    dropped = []
+    row_offset = 0
+    for chunk in chunks:
+        _, dropped_df = gdu.validate_and_clean_data(chunk, 'tmb_data', upload_timestamp, seen_hashes, row_offset)
+        dropped.append(dropped_df)
+        row_offset += len(chunk)
+    dropped = pd.concat(dropped, ignore_index=True)
+    # Only the three distinct valid records are remembered, as raw 64-bit hashes
+    assert seen_hashes[0].dtype == np.uint64 and len(seen_hashes[0]) == 3
+
+    assert dict(zip(dropped['index'], dropped['reason'])) == {
+        1: 'Invalid values in columns: TMB: Below minimum value 0',
+        3: 'Invalid values in columns: TMB: Below minimum value 0',
+        4: 'Duplicate record',
+    }
+
+
+def sample_frames():
+    tmb = pd.DataFrame({'SampleName': ['S1', 'S2'], 'TMB': [1.5, 2.5],
+                        'BinomialLow': [0.1, 0.2], 'BinomialHigh': [0.8, 0.9]})
+    cns = pd.DataFrame({'CHROM': ['chr1', 'chrX'], 'START': [100, 200], 'STOP': [150, 250],
+                        'GENE': ['TP53', 'EGFR'], 'log2': [0.5, -0.5], 'SampleName': ['S1', 'S1']})
+    return {'tmb_data': tmb, 'cns_data': cns}
+
+
+class RecordingEngine:
+    """Stands in for an engine, keeping the statements validate_database_schema runs"""
+    def __init__(self):
+        self.statements = []
+
+    @contextmanager
+    def connect(self):
+        yield self
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+
+    def commit(self):
+        pass
+
+
+def test_loaded_columns_match_schema_ddl(monkeypatch):
+    engine = RecordingEngine()
+    assert gdu.validate_database_schema(engine)
+    ddl_columns = {}
+    for statement in engine.statements:
+        table_name = re.search(r'CREATE TABLE IF NOT EXISTS (\w+)', statement).group(1)
+        # Unquoted identifiers are folded to lower case by PostgreSQL
+        ddl_columns[table_name] = {name.lower() for name in re.findall(r'^\s+(\w+) ', statement, re.MULTILINE)}
+
+    loaded_columns = {}
+    def capture(chunks, table_name, engine):
+        chunks = list(chunks)
+        loaded_columns[table_name] = set(chunks[0].columns)
+        return sum(len(chunk) for chunk in chunks)
+    monkeypatch.setattr(gdu, 'copy_chunks_to_postgres', capture)
+    monkeypatch.setattr(gdu, 'verify_upload', lambda df, table_name, engine: True)
+
+    for table_name, df in sample_frames().items():
+        assert gdu.upload_to_database(df, table_name, None)
+        assert loaded_columns[table_name] <= ddl_columns[table_name]
+
+
+@pytest.mark.skipif(not os.environ.get('GENOMIC_TEST_DATABASE_URL'),
+                    reason='GENOMIC_TEST_DATABASE_URL does not point at a scratch PostgreSQL database')
+@pytest.mark.parametrize('options', [
+    {}, {'copy_format': 'binary'}, {'unlogged_staging': True}, {'use_copy': False}
+], ids=['csv', 'binary', 'unlogged', 'insert'])
+def test_upload_round_trip_into_schema_tables(options):
+    if options.get('copy_format') == 'binary':
+        pytest.importorskip('pgcopy')
+    engine = create_engine(os.environ['GENOMIC_TEST_DATABASE_URL'])
+    assert gdu.validate_database_schema(engine)
+    try:
+        for table_name, df in sample_frames().items():
+            assert gdu.upload_to_database(df, table_name, engine, **options)
+            with engine.connect() as conn:
+                count = conn.execute(text(f"SELECT COUNT(*) FROM {table_name} WHERE samplename = 'S1'")).scalar()
+            assert count == (df['SampleName'] == 'S1').sum()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("TRUNCATE tmb_data, cns_data"))
+        engine.dispose()
+
+
+@pytest.mark.parametrize('chunksize', [None, 2])
+def test_empty_integer_column_drops_rows_instead_of_failing(tmp_path, chunksize):
+    header = 'chromosome\tstart\tend\tgene\tlog2\tci_hi\tci_lo\tcn\tdepth\tprobes\tweight\n'
+    rows = ['chr1\t\t200\tTP53\t0.5\t0.6\t0.4\t2\t30\t5\t1.0\n'] * 2 + \
+           ['chr2\t\t400\tEGFR\t-0.5\t-0.4\t-0.6\t1\t30\t5\t1.0\n']
+    path = tmp_path / 'S1.cns'
+    path.write_text(header + ''.join(rows))
+
+    frames = gdu.read_file(str(path), chunksize=chunksize)
+    chunks = [frames] if chunksize is None else list(frames)
+    dropped = 0
+    for chunk in chunks:
+        cleaned_df, dropped_df = gdu.validate_and_clean_data(chunk, 'cns_data')
+        assert cleaned_df is None
+        dropped += len(dropped_df)
+    assert dropped == 3
+
+
+def test_dropped_records_share_one_column_set():
+    upload_timestamp = pd.Timestamp('2024-01-01')
+    seen_hashes = []
+    frame = {'SampleName': ['S1'], 'BinomialLow': [0.1], 'BinomialHigh': [0.9]}
+    _, invalid = gdu.validate_and_clean_data(pd.DataFrame({**frame, 'TMB': [-1.0]}), 'tmb_data',
+                                             upload_timestamp, seen_hashes)
+    for _ in range(2):
+        _, duplicate = gdu.validate_and_clean_data(pd.DataFrame({**frame, 'TMB': [1.0]}), 'tmb_data',
+                                                   upload_timestamp, seen_hashes, 1)
+
+    assert set(invalid.columns) == set(duplicate.columns)
+    assert invalid['record_hash'].isna().all()
+    assert duplicate['record_hash'].notna().all()
+
+
+def test_create_table_if_missing_tolerates_a_concurrent_create(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    df = pd.DataFrame({'samplename': ['S1'], 'mean_coverage': [30.0]})
+    df.head(0).to_sql('coverage_data', engine, index=False)
+    # Another worker created the table after this one found it missing
+    monkeypatch.setattr(gdu, 'table_exists', lambda table_name, engine: False)
+
+    gdu.create_table_if_missing(df, 'coverage_data', engine)
+    engine.dispose()
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pycircos')
+pytest.importorskip('Bio')
+
+import genomic_visualizations as gv
+
+
+def test_igv_export_writes_missing_log2_as_nan(tmp_path):
+    df = pd.DataFrame({'chrom': ['2', '1'], 'start_pos': [300, 100], 'stop_pos': [400, 200],
+                       'log2': [np.nan, 0.5]})
+    visualizer = gv.GenomicVisualizer(str(tmp_path))
+
+    output_file = visualizer.export_for_igv(df)
+    assert output_file is not None
+    with open(output_file) as f:
+        lines = f.read().splitlines()
+    assert lines[1:] == [
+        'fixedStep chrom=chr1 start=100 step=100', '0.5',
+        'fixedStep chrom=chr2 start=300 step=100', 'nan',
+    ]
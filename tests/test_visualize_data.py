@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("pycircos")
+pytest.importorskip("Bio")
+
+import visualize_data
+
+
+def empty_cns_frame():
+    return pd.DataFrame({
+        'gene': pd.Categorical([]),
+        'sample_name': pd.Series([], dtype=object),
+        'log2': pd.Series([], dtype='float32'),
+    })
+
+
+@pytest.mark.parametrize("top_genes", [None, [], ['TP53']])
+def test_gene_cnv_heatmap_handles_empty_data(top_genes):
+    fig = visualize_data.plot_gene_cnv_heatmap(empty_cns_frame(), top_genes)
+    assert len(fig.data) == 0
+
+
+def test_gene_cnv_heatmap_renders_image():
+    df = pd.DataFrame({
+        'gene': pd.Categorical(['A', 'A', 'B']),
+        'sample_name': ['s1', 's2', 's1'],
+        'log2': pd.array([-1.0, 0.5, 2.5], dtype='float32'),
+    })
+    fig = visualize_data.plot_gene_cnv_heatmap(df, ['A', 'B'])
+    assert fig.data[0].source.startswith('data:image/png')
+    assert list(fig.layout.yaxis.ticktext) == ['A', 'B']
+
+
+class CopyOutConnection:
+    """Stands in for a psycopg2 connection whose COPY TO STDOUT writes a fixed CSV"""
+    def __init__(self, csv_text):
+        self.csv_text = csv_text
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def copy_expert(self, sql, buffer):
+        buffer.write(self.csv_text.encode())
+
+    def close(self):
+        pass
+
+
+class CopyOutEngine:
+    class dialect:
+        driver = 'psycopg2'
+
+    def __init__(self, csv_text):
+        self.csv_text = csv_text
+
+    def raw_connection(self):
+        return CopyOutConnection(self.csv_text)
+
+
+def test_read_sql_copy_keeps_numeric_looking_text():
+    engine = CopyOutEngine("sample_name,gene,start_pos,stop_pos,log2\n"
+                           "000001,7SK,100,200,0.5\n"
+                           "000002,1234,300,400,\n")
+    df = visualize_data.read_sql_copy("SELECT 1", engine, visualize_data.CNS_DTYPES,
+                                      visualize_data.CNS_TEXT_COLUMNS)
+    assert df['sample_name'].tolist() == ['000001', '000002']
+    assert df['gene'].tolist() == ['7SK', '1234']
+    assert df['start_pos'].dtype == 'int32'
@@ -3,63 +3,309 @@ import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from matplotlib import colormaps
+from sqlalchemy import create_engine, text
+import io
 import json
 import os
-from genomic_visualizations import GenomicVisualizer
+from genomic_visualizations import GenomicVisualizer, chrom_categorical
+
+DB_CONFIG_FILE = 'db_config.json'
 
 def load_db_config():
     """Load database configuration"""
-    with open('db_config.json', 'r') as f:
+    with open(DB_CONFIG_FILE, 'r') as f:
         return json.load(f)
 
+# Connection settings are read once at import; a DATABASE_URL environment variable
+# takes precedence over the config file
+DATABASE_URL = os.environ.get('DATABASE_URL')
+DB_CONFIG = None if DATABASE_URL or not os.path.exists(DB_CONFIG_FILE) else load_db_config()
+
+@st.cache_resource
 def create_db_connection():
-    """Create database connection"""
-    config = load_db_config()
-    connection_string = f"postgresql://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['database']}"
-    return create_engine(connection_string)
+    """Create the database engine once and share it across reruns and sessions"""
+    if DATABASE_URL:
+        connection_string = DATABASE_URL
+    elif DB_CONFIG is None:
+        raise FileNotFoundError(f"{DB_CONFIG_FILE} not found and DATABASE_URL is not set")
+    else:
+        config = DB_CONFIG
+        connection_string = f"postgresql+psycopg2://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['database']}"
+    # One pool serves every session: a few warm connections plus headroom for bursts,
+    # checked before use and recycled before idle-connection timeouts drop them
+    return create_engine(
+        connection_string,
+        pool_size=4,
+        max_overflow=8,
+        pool_pre_ping=True,
+        pool_recycle=1800
+    )
+
+# Seconds a query result is reused across reruns before it is fetched again
+CACHE_TTL = 300
+
+# Narrow column types applied to each chunk of a query result as it arrives
+TMB_DTYPES = {'tmb': 'float32', 'binomial_low': 'float32', 'binomial_high': 'float32'}
+CNS_DTYPES = {'start_pos': 'int32', 'stop_pos': 'int32', 'log2': 'float32'}
+# Text columns whose values may look numeric (e.g. sample '000001'), read as strings
+CNS_TEXT_COLUMNS = ('sample_name', 'gene')
+
+def fitting_dtypes(chunk, dtypes):
+    """
+    Return dtypes without the integer casts that would overflow for this chunk.
+    
+    NumPy wraps out-of-range integers silently, so a column whose values do not fit
+    the narrow type is left at the driver's 64-bit type instead.
+    """
+    fitting = {}
+    for column, dtype in dtypes.items():
+        if np.issubdtype(np.dtype(dtype), np.integer) and not chunk[column].empty:
+            info = np.iinfo(dtype)
+            if chunk[column].min() < info.min or chunk[column].max() > info.max:
+                continue
+        fitting[column] = dtype
+    return fitting
+
+def read_sql_typed(query, engine, dtypes, chunksize=100_000, **kwargs):
+    """
+    Read a query result in chunks, casting each chunk to dtypes before fetching the next.
+    
+    Rows are streamed from a server-side cursor, so only one chunk is ever held at the
+    driver's default 64-bit types.
+    """
+    with engine.connect().execution_options(stream_results=True) as conn:
+        chunks = [
+            chunk.astype(fitting_dtypes(chunk, dtypes))
+            for chunk in pd.read_sql(query, conn, chunksize=chunksize, **kwargs)
+        ]
+    return pd.concat(chunks, ignore_index=True)
+
+def read_sql_copy(query, engine, dtypes, text_columns=()):
+    """
+    Read a parameterless query with COPY ... TO STDOUT and parse the CSV with pyarrow.
+    
+    The server streams the result as one CSV document and pyarrow parses it in native
+    code, skipping the driver's per-row tuple building. pyarrow infers column types from
+    the text, so the query's text columns must be named in text_columns to be kept as
+    strings. Engines on a driver other than psycopg2 fall back to read_sql_typed.
+    """
+    if engine.dialect.driver != 'psycopg2':
+        return read_sql_typed(query, engine, dtypes)
+    
+    buffer = io.BytesIO()
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER", buffer)
+    finally:
+        conn.close()
+    buffer.seek(0)
+    
+    # Unquoted empty fields are NULLs in PostgreSQL's CSV output
+    convert_options = pa_csv.ConvertOptions(
+        column_types={column: pa.string() for column in text_columns},
+        strings_can_be_null=True
+    )
+    df = pa_csv.read_csv(buffer, convert_options=convert_options).to_pandas()
+    return df.astype(fitting_dtypes(df, dtypes))
 
-def load_tmb_data(engine):
+@st.cache_data(ttl=CACHE_TTL)
+def load_tmb_data(_engine):
     """Load TMB data from database"""
     query = """
     SELECT sample_name, tmb, binomial_low, binomial_high, upload_timestamp
     FROM genomic.tmb_data
     ORDER BY upload_timestamp DESC
     """
-    return pd.read_sql(query, engine)
+    return read_sql_typed(query, _engine, TMB_DTYPES)
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_tmb_summary(_engine):
+    """Load the sample count, mean and median TMB, computed in the database"""
+    query = """
+    SELECT COUNT(*) AS sample_count,
+           AVG(tmb) AS mean_tmb,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY tmb) AS median_tmb
+    FROM genomic.tmb_data
+    """
+    return pd.read_sql(query, _engine).iloc[0].to_dict()
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_cns_summary(_engine):
+    """Load the sample, gene and segment counts of the CNS table, computed in the database"""
+    query = """
+    SELECT COUNT(DISTINCT sample_name) AS sample_count,
+           COUNT(DISTINCT gene) AS gene_count,
+           COUNT(*) AS segment_count
+    FROM genomic.cns_data
+    """
+    return pd.read_sql(query, _engine).iloc[0].to_dict()
+
+def format_metric(value):
+    """Format a summary statistic for st.metric; empty tables have none"""
+    return "n/a" if pd.isna(value) else f"{value:.2f}"
 
-def load_cns_data(engine):
+# Chromosomes are stored as SMALLINT codes; codes past the autosomes are shown by name
+CHROM_LABELS = {'23': 'X', '24': 'Y', '25': 'MT'}
+
+def decode_chrom(series):
+    """Convert stored chromosome codes back to chromosome names"""
+    return series.astype('string').replace(CHROM_LABELS)
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_cns_data(_engine):
     """Load CNS data from database"""
     query = """
     SELECT sample_name, chrom, start_pos, stop_pos, gene, log2, upload_timestamp
     FROM genomic.cns_data
     ORDER BY upload_timestamp DESC
     """
-    return pd.read_sql(query, engine)
+    df = read_sql_copy(query, _engine, CNS_DTYPES, CNS_TEXT_COLUMNS)
+    # One ordered 'chr'-labelled categorical shared by the plots and the exporters
+    df['chrom'] = chrom_categorical(decode_chrom(df['chrom']))
+    # Genes repeat across samples, so counting, filtering and grouping run on integer codes
+    df['gene'] = df['gene'].astype('category')
+    return df
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_chrom_coverage(_engine):
+    """Load the span and segment count of each chromosome, aggregated in the database"""
+    query = """
+    SELECT chrom, MIN(start_pos) AS start_pos, MAX(stop_pos) AS stop_pos,
+           MAX(stop_pos) - MIN(start_pos) AS coverage, COUNT(*) AS segment_count
+    FROM genomic.cns_data
+    GROUP BY chrom
+    ORDER BY chrom
+    """
+    df = pd.read_sql(query, _engine)
+    df['chrom'] = chrom_categorical(decode_chrom(df['chrom']))
+    return df
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_top_genes(_engine, n=20):
+    """Load the n genes with the most CNS segments"""
+    query = text("""
+    SELECT gene
+    FROM genomic.cns_data
+    WHERE gene IS NOT NULL
+    GROUP BY gene
+    ORDER BY COUNT(*) DESC, gene
+    LIMIT :n
+    """)
+    return pd.read_sql(query, _engine, params={'n': n})['gene'].tolist()
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_cns_for_genes(_engine, genes):
+    """Load the log2 ratio of every CNS segment for the given genes"""
+    query = text("""
+    SELECT gene, sample_name, log2
+    FROM genomic.cns_data
+    WHERE gene = ANY(:genes)
+    """)
+    df = read_sql_typed(query, _engine, {'log2': 'float32'}, params={'genes': list(genes)})
+    df['gene'] = df['gene'].astype('category')
+    return df
 
+def category_options(values):
+    """
+    Values present in a categorical column, in category order, for a selection widget.
+    
+    Reads the categories instead of scanning and sorting every row: chromosomes come
+    out in genome order and genes alphabetically.
+    """
+    return values.cat.remove_unused_categories().cat.categories.tolist()
+
+def frame_fingerprint(df):
+    """
+    Cheap cache key for a query result passed to a plot function.
+    
+    Full tables are identified by their shape and newest upload instead of hashing every
+    row; small aggregated frames without an upload timestamp are hashed in full.
+    """
+    key = (df.shape, tuple(df.columns))
+    if 'upload_timestamp' in df.columns:
+        return key + (df['upload_timestamp'].max(),)
+    return key + (int(pd.util.hash_pandas_object(df, index=False).sum()),)
+
+# Figures are rebuilt only when their input data changes, not on every rerun
+cache_figure = st.cache_data(ttl=CACHE_TTL, hash_funcs={pd.DataFrame: frame_fingerprint})
+
+# Rows of a raw-data table sent to the browser; the full table is offered as a download
+RAW_DATA_PREVIEW_ROWS = 1000
+
+@st.cache_data(ttl=CACHE_TTL)
+def to_parquet_bytes(_df, cache_key):
+    """Serialise a DataFrame to Parquet once per cache_key (which must identify its content)"""
+    buffer = io.BytesIO()
+    _df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+def show_raw_data(df, file_name, cache_key):
+    """Show the first rows of a table and offer the whole table as a Parquet download"""
+    st.caption(f"Showing first {min(len(df), RAW_DATA_PREVIEW_ROWS):,} of {len(df):,} rows")
+    st.dataframe(df.head(RAW_DATA_PREVIEW_ROWS), use_container_width=True)
+    st.download_button(
+        label="Download Full Table (Parquet)",
+        data=to_parquet_bytes(df, cache_key),
+        file_name=file_name,
+        mime="application/octet-stream"
+    )
+
+@cache_figure
 def plot_tmb_distribution(df):
     """Plot TMB distribution"""
-    fig = px.histogram(
-        df,
-        x='tmb',
+    # Bin on the server so the browser receives 30 bar heights instead of every sample
+    counts, edges = np.histogram(df['tmb'].dropna().to_numpy(), bins=30)
+    fig = go.Figure(go.Bar(
+        x=0.5 * (edges[:-1] + edges[1:]),
+        y=counts,
+        width=np.diff(edges)
+    ))
+    fig.update_layout(
         title='TMB Distribution Across Samples',
-        labels={'tmb': 'Tumor Mutational Burden', 'count': 'Number of Samples'},
-        nbins=30
+        xaxis_title='Tumor Mutational Burden',
+        yaxis_title='Number of Samples',
+        bargap=0,
+        showlegend=False
     )
-    fig.update_layout(showlegend=False)
     return fig
 
+# Larger cohorts are drawn as about CI_PLOT_BINS binned points rather than one per sample
+CI_PLOT_MAX_POINTS = 10_000
+CI_PLOT_BINS = 5000
+
+@cache_figure
 def plot_tmb_confidence_intervals(df):
     """Plot TMB with confidence intervals"""
     fig = go.Figure()
     
-    # Sort by TMB value for better visualization
-    df_sorted = df.sort_values('tmb')
+    # Sort by TMB value for better visualization; samples are placed by rank. Only the
+    # three plotted columns are reordered, as typed arrays Plotly can serialise directly.
+    tmb = df['tmb'].to_numpy(dtype=np.float32)
+    order = np.argsort(tmb, kind='stable')
+    y_tmb = tmb[order]
+    y_low = df['binomial_low'].to_numpy(dtype=np.float32)[order]
+    y_high = df['binomial_high'].to_numpy(dtype=np.float32)[order]
+    x = np.arange(len(order), dtype=np.int32)
+    
+    if len(order) > CI_PLOT_MAX_POINTS:
+        # Summarise runs of neighbouring samples: mean TMB inside the widest interval.
+        # Each bin is placed at the rank of its first sample.
+        k = len(order) // CI_PLOT_BINS
+        starts = x[::k]
+        sizes = np.diff(np.append(starts, len(order)))
+        y_tmb = (np.add.reduceat(y_tmb, starts, dtype=np.float64) / sizes).astype(np.float32)
+        y_low = np.fmin.reduceat(y_low, starts)
+        y_high = np.fmax.reduceat(y_high, starts)
+        x = starts
     
     # Add confidence intervals
     fig.add_trace(go.Scatter(
-        x=df_sorted.index,
-        y=df_sorted['binomial_high'],
+        x=x,
+        y=y_high,
         mode='lines',
         line=dict(width=0),
         showlegend=False,
@@ -67,8 +313,8 @@ def plot_tmb_confidence_intervals(df):
     ))
     
     fig.add_trace(go.Scatter(
-        x=df_sorted.index,
-        y=df_sorted['binomial_low'],
+        x=x,
+        y=y_low,
         mode='lines',
         fill='tonexty',
         line=dict(width=0),
@@ -78,8 +324,8 @@ def plot_tmb_confidence_intervals(df):
     
     # Add TMB values
     fig.add_trace(go.Scatter(
-        x=df_sorted.index,
-        y=df_sorted['tmb'],
+        x=x,
+        y=y_tmb,
         mode='markers',
         name='TMB',
         marker=dict(size=8, color='rgb(31, 119, 180)')
@@ -93,17 +339,9 @@ def plot_tmb_confidence_intervals(df):
     )
     return fig
 
-def plot_chromosome_coverage(df):
-    """Plot coverage across chromosomes"""
-    # Calculate coverage per chromosome
-    coverage = df.groupby('chrom').agg({
-        'start_pos': 'min',
-        'stop_pos': 'max',
-        'sample_name': 'count'
-    }).reset_index()
-    
-    coverage['coverage'] = coverage['stop_pos'] - coverage['start_pos']
-    
+@cache_figure
+def plot_chromosome_coverage(coverage):
+    """Plot coverage across chromosomes from per-chromosome spans (see load_chrom_coverage)"""
     fig = px.bar(
         coverage,
         x='chrom',
@@ -116,25 +354,60 @@ def plot_chromosome_coverage(df):
     )
     return fig
 
-def plot_gene_cnv_heatmap(df):
+# Most sample columns drawn in the CNV heatmap
+HEATMAP_MAX_SAMPLES = 200
+# log2 ratio at which the heatmap colours saturate, symmetric around zero
+LOG2_COLOR_LIMIT = 2
+HEATMAP_COLORMAP = colormaps['RdBu_r'].with_extremes(bad='lightgrey')
+
+@cache_figure
+def plot_gene_cnv_heatmap(df, top_genes=None):
     """Plot CNV heatmap for top genes"""
-    # Get top genes by frequency
-    top_genes = df['gene'].value_counts().head(20).index
+    # Get top genes by frequency unless they were already ranked (see load_top_genes)
+    if top_genes is None:
+        top_genes = df['gene'].value_counts().head(20).index
     
-    # Pivot data for heatmap
-    pivot_data = df[df['gene'].isin(top_genes)].pivot_table(
-        index='gene',
-        columns='sample_name',
-        values='log2',
-        aggfunc='mean'
+    # Pivot data for heatmap: mean log2 per gene and sample, genes in rank order
+    pivot_data = (
+        df[df['gene'].isin(top_genes)]
+        .groupby(['gene', 'sample_name'], observed=True)['log2']
+        .mean()
+        .unstack('sample_name')
+        .reindex(top_genes)
     )
     
+    # Past a few hundred columns the heatmap is unreadable and slow to draw, so keep the
+    # samples whose log2 ratios vary most across the top genes
+    if pivot_data.shape[1] > HEATMAP_MAX_SAMPLES:
+        variance = pivot_data.var().fillna(-1)
+        keep = variance.nlargest(HEATMAP_MAX_SAMPLES).index
+        pivot_data = pivot_data.loc[:, pivot_data.columns.isin(keep)]
+    
+    # An empty table or an empty gene ranking leaves nothing to draw, and an empty image
+    # cannot be encoded, so show an empty figure instead
+    if pivot_data.empty:
+        fig = go.Figure()
+        fig.update_layout(title='Copy Number Variation Heatmap (no copy number data)')
+        return fig
+    
+    # Colour the cells here and ship the matrix as one PNG instead of a JSON z-array:
+    # diverging red (gain) / blue (loss), clipped at +/-LOG2_COLOR_LIMIT, grey where missing
+    log2 = np.ma.masked_invalid(pivot_data.to_numpy(dtype=float))
+    scaled = (np.clip(log2, -LOG2_COLOR_LIMIT, LOG2_COLOR_LIMIT) + LOG2_COLOR_LIMIT) / (2 * LOG2_COLOR_LIMIT)
+    rgb = HEATMAP_COLORMAP(scaled, bytes=True)[..., :3]
+    
     fig = px.imshow(
-        pivot_data,
-        title='Copy Number Variation Heatmap',
-        labels=dict(x='Sample', y='Gene', color='Log2 Ratio'),
+        rgb,
+        binary_string=True,
+        title=f'Copy Number Variation Heatmap (log2 ratio, red = gain, blue = loss, clipped at ±{LOG2_COLOR_LIMIT})',
+        labels=dict(x='Sample', y='Gene'),
         aspect='auto'
     )
+    # Image traces only take numeric coordinates, so label the cells through the ticks
+    fig.update_xaxes(tickmode='array', tickvals=np.arange(pivot_data.shape[1]),
+                     ticktext=pivot_data.columns.astype(str).tolist())
+    fig.update_yaxes(tickmode='array', tickvals=np.arange(pivot_data.shape[0]),
+                     ticktext=pivot_data.index.astype(str).tolist())
     return fig
 
 def main():
@@ -158,14 +431,15 @@ def main():
         st.header("Tumor Mutational Burden Analysis")
         
         try:
-            tmb_data = load_tmb_data(engine)
-            
             # Display summary statistics
             st.subheader("Summary Statistics")
+            summary = load_tmb_summary(engine)
             col1, col2, col3 = st.columns(3)
-            col1.metric("Total Samples", len(tmb_data))
-            col2.metric("Average TMB", f"{tmb_data['tmb'].mean():.2f}")
-            col3.metric("Median TMB", f"{tmb_data['tmb'].median():.2f}")
+            col1.metric("Total Samples", int(summary['sample_count']))
+            col2.metric("Average TMB", format_metric(summary['mean_tmb']))
+            col3.metric("Median TMB", format_metric(summary['median_tmb']))
+            
+            tmb_data = load_tmb_data(engine)
             
             # TMB Distribution
             st.subheader("TMB Distribution")
@@ -175,9 +449,10 @@ def main():
             st.subheader("TMB Values with Confidence Intervals")
             st.plotly_chart(plot_tmb_confidence_intervals(tmb_data), use_container_width=True)
             
-            # Raw data table
+            # Raw data table, only sent to the browser on request
             st.subheader("Raw Data")
-            st.dataframe(tmb_data)
+            if st.checkbox("Show raw TMB data", key="show_raw_tmb"):
+                show_raw_data(tmb_data, "tmb_data.parquet", ('tmb', frame_fingerprint(tmb_data)))
             
         except Exception as e:
             st.error(f"Error loading TMB data: {str(e)}")
@@ -186,45 +461,50 @@ def main():
         st.header("Copy Number Variation Analysis")
         
         try:
-            cns_data = load_cns_data(engine)
-            
             # Display summary statistics
             st.subheader("Summary Statistics")
+            summary = load_cns_summary(engine)
             col1, col2, col3 = st.columns(3)
-            col1.metric("Total Samples", len(cns_data['sample_name'].unique()))
-            col2.metric("Total Genes", len(cns_data['gene'].unique()))
-            col3.metric("Total Segments", len(cns_data))
+            col1.metric("Total Samples", int(summary['sample_count']))
+            col2.metric("Total Genes", int(summary['gene_count']))
+            col3.metric("Total Segments", int(summary['segment_count']))
             
             # Chromosome Coverage
             st.subheader("Chromosome Coverage")
-            st.plotly_chart(plot_chromosome_coverage(cns_data), use_container_width=True)
+            st.plotly_chart(plot_chromosome_coverage(load_chrom_coverage(engine)), use_container_width=True)
             
-            # CNV Heatmap
+            # CNV Heatmap, fetching only the segments of the top genes ranked by the database
             st.subheader("Copy Number Variation Heatmap (Top 20 Genes)")
-            st.plotly_chart(plot_gene_cnv_heatmap(cns_data), use_container_width=True)
+            top_genes = load_top_genes(engine)
+            st.plotly_chart(plot_gene_cnv_heatmap(load_cns_for_genes(engine, top_genes), top_genes),
+                            use_container_width=True)
             
-            # Raw data table with filters
+            # Raw data table with filters; every segment is only fetched when it is asked for
             st.subheader("Raw Data")
-            
-            # Filters
-            col1, col2 = st.columns(2)
-            selected_chrom = col1.multiselect(
-                "Filter by Chromosome",
-                options=sorted(cns_data['chrom'].unique())
-            )
-            selected_genes = col2.multiselect(
-                "Filter by Gene",
-                options=sorted(cns_data['gene'].unique())
-            )
-            
-            # Apply filters
-            filtered_data = cns_data
-            if selected_chrom:
-                filtered_data = filtered_data[filtered_data['chrom'].isin(selected_chrom)]
-            if selected_genes:
-                filtered_data = filtered_data[filtered_data['gene'].isin(selected_genes)]
-            
-            st.dataframe(filtered_data)
+            if st.checkbox("Show raw CNS data", key="show_raw_cns"):
+                cns_data = load_cns_data(engine)
+                
+                # Filters
+                col1, col2 = st.columns(2)
+                selected_chrom = col1.multiselect(
+                    "Filter by Chromosome",
+                    options=category_options(cns_data['chrom'])
+                )
+                selected_genes = col2.multiselect(
+                    "Filter by Gene",
+                    options=category_options(cns_data['gene'])
+                )
+                
+                # Apply filters as one combined mask, so at most one filtered copy is made
+                mask = np.ones(len(cns_data), dtype=bool)
+                if selected_chrom:
+                    mask &= cns_data['chrom'].isin(selected_chrom).to_numpy()
+                if selected_genes:
+                    mask &= cns_data['gene'].isin(selected_genes).to_numpy()
+                filtered_data = cns_data if mask.all() else cns_data[mask]
+                
+                show_raw_data(filtered_data, "cns_data.parquet",
+                              ('cns', tuple(selected_chrom), tuple(selected_genes), frame_fingerprint(cns_data)))
             
         except Exception as e:
             st.error(f"Error loading CNS data: {str(e)}")
@@ -308,7 +588,7 @@ def main():
                 # Chromosome selection
                 chrom = st.selectbox(
                     "Select Chromosome",
-                    sorted(cns_data['chrom'].unique())
+                    category_options(cns_data['chrom'])
                 )
                 
                 # Create chromosome plot